@@ -6,6 +6,12 @@ from enum import Enum, auto
 class BoardView(Enum):
     ONE_CHANNEL = auto()
     TWO_CHANNELS = auto()
+    # Bits of the two-channels board, 8 squares of a channel per byte
+    PACKED = auto()
+
+
+# Squares of each byte of a packed board, to unpack it with a lookup into an existing array
+BYTE_SQUARES = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).astype(bool)
 
 
 # Representation of the player in one-channel board view
@@ -25,6 +31,7 @@ class OthelloGame:
     }
 
     ALL_DIRECTIONS = np.array([(1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1)])
+    DIRECTIONS = tuple(map(tuple, ALL_DIRECTIONS.tolist()))
 
     def __init__(self, board_size=8, initial_board=None, current_player=OthelloPlayer.BLACK):
         """Create Othello board game representation
@@ -47,6 +54,12 @@ class OthelloGame:
 
         self.current_player = current_player
 
+        # Disc counts, free squares and frontier (free squares next to a piece) are
+        # updated on each play, instead of being recalculated from the whole board
+        self._points = OthelloGame.get_board_players_points(self._board)
+        self._free_squares = set(map(tuple, OthelloGame.get_board_free_squares(self._board).tolist()))
+        self._frontier = OthelloGame.get_board_frontier_squares(self._board)
+
         # Save the last time when the board was converted to one channel view,
         # this is to avoid matrix operations when that version of the board has
         # been calculated already
@@ -73,6 +86,10 @@ class OthelloGame:
 
         Args:
             board_size ([BoardView]): Type of board visualization, 
+
+        Returns:
+            [ndarray]: The two-channels board of the game, a read-only one-channel board
+                or a new packed board
         """
         if view == BoardView.TWO_CHANNELS:
             return self._board
@@ -80,12 +97,16 @@ class OthelloGame:
             has_to_update = self._one_channel_board_last_update != self.round
             if has_to_update:
                 self._one_channel_board = OthelloGame.convert_to_one_channel_board(self._board)
+                # It's shared by the calls until the next play
+                self._one_channel_board.setflags(write=False)
                 self._one_channel_board_last_update = self.round 
             return self._one_channel_board
+        elif view == BoardView.PACKED:
+            return OthelloGame.pack_board(self._board)
 
         raise TypeError('Expecting BoardView type')
     
-    def is_square_free(self, x, y):
+    def is_square_free(self, row, col):
         """Check if there's not any piece on the board square
 
         Args:
@@ -95,7 +116,7 @@ class OthelloGame:
         Returns:
             [bool]: True if the square is free, otherwise False
         """
-        return OthelloGame.is_board_square_free(self._board, row, col)
+        return (row, col) in self._free_squares
 
     def is_valid_action(self, row, col):
         """Check the square is valid action for current player
@@ -113,9 +134,9 @@ class OthelloGame:
         """Get all valid actions for current player
 
         Returns:
-            [generator ndarray[(x, y), ...]]: All valid squares to current player play 
+            [list[(row, col), ...]]: All valid squares to current player play 
         """
-        return OthelloGame.get_player_valid_actions(self._board, self.current_player)
+        return OthelloGame.get_frontier_player_valid_actions(self._board, self.current_player, self._frontier)
 
     def get_free_squares(self):
         """Get all free squares on board
@@ -123,7 +144,15 @@ class OthelloGame:
         Returns:
             [ndarray[(row, col), ...]]: All free square positions
         """
-        return OthelloGame.get_board_free_squares(self._board)
+        return np.array(sorted(self._free_squares), dtype=int).reshape((-1, 2))
+
+    def get_frontier_squares(self):
+        """Get the free squares next to a piece, the only ones that can be valid actions
+
+        Returns:
+            [set{(row, col), ...}]: Frontier square positions
+        """
+        return set(self._frontier)
     
     def has_finished(self):
         """Check if the game has finished
@@ -142,16 +171,22 @@ class OthelloGame:
         """
         assert not self._has_finished, 'Game has ended'
 
-        OthelloGame.flip_board_squares(self._board, self.current_player, row, col)
+        flip_squares = OthelloGame.flip_board_squares(self._board, self.current_player, row, col)
+
+        self._points[self.current_player] += len(flip_squares) + 1
+        self._points[self.current_player.opponent] -= len(flip_squares)
+        self._free_squares.discard((row, col))
+        OthelloGame.update_frontier_squares(self._board, self._frontier, row, col)
         
         self._round += 1
         
         self.current_player = self.current_player.opponent
     
-        can_new_player_play = OthelloGame.has_player_actions_on_board(self._board, self.current_player)
+        can_new_player_play = OthelloGame.has_frontier_player_actions(self._board, self.current_player, self._frontier)
 
         if not can_new_player_play:
-            can_previous_player_play = OthelloGame.has_player_actions_on_board(self._board, self.current_player.opponent)
+            can_previous_player_play = OthelloGame.has_frontier_player_actions(self._board, self.current_player.opponent,
+                                                                               self._frontier)
 
             if not can_previous_player_play:
                 self._has_finished = True
@@ -164,7 +199,7 @@ class OthelloGame:
         Returns:
             [dict]: Points of each player
         """
-        return OthelloGame.get_board_players_points(self._board)
+        return dict(self._points)
     
     def get_winning_player(self):
         """Get winning player 
@@ -172,13 +207,13 @@ class OthelloGame:
         Returns:
             [tuple]: ([OthelloPlayer], [int] Player points)
         """
-        return OthelloGame.get_board_winning_player(self._board)
+        return max(self._points.items(), key=lambda item: item[1])
 
     @staticmethod
     def initial_board(board_size):
         assert board_size % 2 == 0, 'Board size must be even'
         
-        initial = np.array([[[0, 1], [1, 0]], [[1, 0], [0, 1]]], dtype=np.bool)
+        initial = np.array([[[0, 1], [1, 0]], [[1, 0], [0, 1]]], dtype=bool)
         pad = (board_size - 2) // 2
 
         return np.pad(initial, ((pad, pad), (pad, pad), (0, 0)), constant_values=0)
@@ -200,6 +235,60 @@ class OthelloGame:
     @staticmethod
     def get_board_free_squares(board):
         return np.argwhere(np.amax(board, axis=2) == 0)
+
+    @staticmethod
+    def get_board_frontier_squares(board):
+        """Get the free squares next to a piece
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board
+
+        Returns:
+            [set{(row, col), ...}]: Frontier square positions
+        """
+        occupied = np.amax(board, axis=2)
+        board_size = occupied.shape[0]
+        padded = np.pad(occupied, 1, constant_values=0)
+        neighbours = np.zeros_like(occupied)
+        for row_offset, col_offset in OthelloGame.DIRECTIONS:
+            neighbours |= padded[1 + row_offset:1 + row_offset + board_size, 1 + col_offset:1 + col_offset + board_size]
+        return set(map(tuple, np.argwhere(neighbours & ~occupied).tolist()))
+
+    @staticmethod
+    def update_frontier_squares(board, frontier, row, col):
+        """Update the frontier after a piece is added to the board
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board, with the new piece
+            frontier ([set]): Frontier square positions, updated in place
+            row ([int]): Piece position on row
+            col ([int]): Piece position on col
+        """
+        board_size = board.shape[0]
+        frontier.discard((row, col))
+        for row_offset, col_offset in OthelloGame.DIRECTIONS:
+            neighbour_row, neighbour_col = row + row_offset, col + col_offset
+            if 0 <= neighbour_row < board_size and 0 <= neighbour_col < board_size \
+                    and not board[neighbour_row, neighbour_col].any():
+                frontier.add((neighbour_row, neighbour_col))
+
+    @staticmethod
+    def get_frontier_player_valid_actions(board, player, frontier):
+        """Get the valid actions of a player looking only at the frontier squares
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board
+            player ([OthelloPlayer]): Player of the actions
+            frontier ([set]): Frontier square positions
+
+        Returns:
+            [list[(row, col), ...]]: Valid actions, in row-major order
+        """
+        return [s for s in sorted(frontier) if OthelloGame.count_action_flips(board, player, *s)]
+
+    @staticmethod
+    def has_frontier_player_actions(board, player, frontier):
+        return any(OthelloGame.count_action_flips(board, player, *s) for s in frontier)
     
     @staticmethod
     def is_board_square_free(board, row, col):
@@ -231,6 +320,7 @@ class OthelloGame:
                         break
                     elif board[row, col, OthelloGame.PLAYER_CHANNELS[player]]:
                         yield from flip_squares
+                        break
                     else:
                         flip_squares.append((row, col))
 
@@ -239,12 +329,15 @@ class OthelloGame:
         player_channel = OthelloGame.PLAYER_CHANNELS[player]
         opponent_channel = OthelloGame.PLAYER_CHANNELS[player.opponent]
 
-        for flip_row, flip_col in OthelloGame.get_action_flip_squares(board, player, row, col):
+        flip_squares = list(OthelloGame.get_action_flip_squares(board, player, row, col))
+        for flip_row, flip_col in flip_squares:
             board[flip_row, flip_col, player_channel] = 1
             board[flip_row, flip_col, opponent_channel] = 0
         
         board[row, col, player_channel] = 1
         board[row, col, opponent_channel] = 0
+
+        return flip_squares
     
     @staticmethod
     def has_board_finished(board):
@@ -263,42 +356,232 @@ class OthelloGame:
     def has_player_actions_on_board(board, player):
         return next(OthelloGame.get_player_valid_actions(board, player), False) is not False
 
+    @staticmethod
+    def count_action_flips(board, player, row, col):
+        """Count the squares flipped by an action without changing the board
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board
+            player ([OthelloPlayer]): Player of the action
+            row ([int]): square row position
+            col ([int]): square col position
+
+        Returns:
+            [int]: Number of opponent pieces flipped, 0 if the action is not valid
+        """
+        if not OthelloGame.is_board_square_free(board, row, col):
+            return 0
+
+        board_size = board.shape[0]
+        player_channel = OthelloGame.PLAYER_CHANNELS[player]
+        opponent_channel = OthelloGame.PLAYER_CHANNELS[player.opponent]
+
+        flips = 0
+        for row_offset, col_offset in OthelloGame.DIRECTIONS:
+            direction_row, direction_col = row + row_offset, col + col_offset
+            direction_flips = 0
+            while 0 <= direction_row < board_size and 0 <= direction_col < board_size \
+                    and board[direction_row, direction_col, opponent_channel]:
+                direction_flips += 1
+                direction_row += row_offset
+                direction_col += col_offset
+            if direction_flips and 0 <= direction_row < board_size and 0 <= direction_col < board_size \
+                    and board[direction_row, direction_col, player_channel]:
+                flips += direction_flips
+        return flips
+
+    @staticmethod
+    def get_player_actions_gains(board, player):
+        """Get the number of pieces flipped by each valid action
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board
+            player ([OthelloPlayer]): Player of the actions
+
+        Returns:
+            [dict]: Flipped pieces of each valid action (row, col)
+        """
+        gains = {}
+        for row, col in OthelloGame.get_board_free_squares(board).tolist():
+            flips = OthelloGame.count_action_flips(board, player, row, col)
+            if flips:
+                gains[(row, col)] = flips
+        return gains
+
+    @staticmethod
+    def get_greedy_actions_and_gains(board, player):
+        """Get the actions that flip more pieces
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board
+            player ([OthelloPlayer]): Player of the actions
+
+        Returns:
+            [tuple]: ([list] greedy actions, [dict] flipped pieces of each valid action)
+        """
+        gains = OthelloGame.get_player_actions_gains(board, player)
+        best_gain = max(gains.values(), default=None)
+        return [action for action, gain in gains.items() if gain == best_gain], gains
+
     @staticmethod
     def get_greedy_actions(board, player):
-        valid_actions = OthelloGame.get_player_valid_actions(board, player)
-        best_actions = []
-        best_points = None
-        for action in valid_actions:
-            state = np.copy(board)
-            OthelloGame.flip_board_squares(state, player, *action)
-            points = OthelloGame.get_board_players_points(state)[player]
-            if not best_points or points > best_points:
-                best_actions = [action]
-                best_points = points
-            elif points == best_points:
-                best_actions.append(action)
-        return best_actions
+        return OthelloGame.get_greedy_actions_and_gains(board, player)[0]
 
     @staticmethod
-    def convert_to_one_channel_board(board):
-        one_channel = board[:, :, OthelloGame.PLAYER_CHANNELS[OthelloPlayer.BLACK]] * OthelloPlayer.BLACK.value
-        one_channel += board[:, :, OthelloGame.PLAYER_CHANNELS[OthelloPlayer.WHITE]] * OthelloPlayer.WHITE.value
-        return one_channel
+    def get_ordered_player_actions(board, player, gains=None):
+        """Get the valid actions ordered by the number of flipped pieces, for move ordering in search
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board
+            player ([OthelloPlayer]): Player of the actions
+            gains ([dict], optional): Flipped pieces of each valid action, if None it's calculated
+
+        Returns:
+            [list]: Valid actions (row, col), the ones that flip more pieces first
+        """
+        if gains is None:
+            gains = OthelloGame.get_player_actions_gains(board, player)
+        return sorted(gains, key=gains.get, reverse=True)
+
+    @staticmethod
+    def convert_to_one_channel_board(board, out=None):
+        """Convert two-channels boards to one-channel boards, 1 for black, -1 for white and 0 for free
+
+        Args:
+            board (ndarray(..., board_size, board_size, 2)): Two-channels board or a batch of boards
+            out (ndarray(..., board_size, board_size), optional): Array written instead of a new one
+
+        Returns:
+            [ndarray(..., board_size, board_size)]: One-channel boards
+        """
+        # The values are 1 and -1, so a single subtraction of the channels makes the board
+        black = board[..., OthelloGame.PLAYER_CHANNELS[OthelloPlayer.BLACK]]
+        white = board[..., OthelloGame.PLAYER_CHANNELS[OthelloPlayer.WHITE]]
+        return np.subtract(black, white, out=out, dtype=out.dtype if out is not None else int)
     
     @staticmethod
-    def convert_to_two_channels_board(board):
-        first_channel_player = next((k for k in OthelloGame.PLAYER_CHANNELS if OthelloGame.PLAYER_CHANNELS[k] == 0), None)
-        second_channel_player = next((k for k in OthelloGame.PLAYER_CHANNELS if OthelloGame.PLAYER_CHANNELS[k] == 1), None)
+    def convert_to_two_channels_board(board, out=None):
+        """Convert one-channel boards to two-channels boards
+
+        Args:
+            board (ndarray(..., board_size, board_size)): One-channel board or a batch of boards
+            out (ndarray(..., board_size, board_size, 2), optional): Array written instead of a new one
 
-        first_channel = board == first_channel_player.value
-        second_channel = board == second_channel_player.value
-        return np.stack((first_channel, second_channel), axis=2)
+        Returns:
+            [ndarray(..., board_size, board_size, 2)]: Two-channels boards
+        """
+        board = np.asarray(board)
+        if out is None:
+            out = np.empty(board.shape + (2,), dtype=bool)
+        for player, channel in OthelloGame.PLAYER_CHANNELS.items():
+            np.equal(board, player.value, out=out[..., channel])
+        return out
+
+    @staticmethod
+    def pack_board(board):
+        """Pack two-channels boards, the storage of positions kept in caches and tables
+
+        Args:
+            board (ndarray(..., board_size, board_size, 2)): Two-channels board or a batch of boards
+
+        Returns:
+            [ndarray(..., board_size ** 2 // 4)]: Packed boards, 16 bytes for a 8x8 board
+        """
+        board = np.asarray(board, dtype=bool)
+        shape = board.shape[:-3] + (2 * board.shape[-3] * board.shape[-2],)
+        return np.packbits(board.reshape(shape), axis=-1)
+
+    @staticmethod
+    def unpack_board(packed, board_size, out=None):
+        """Unpack boards packed by pack_board
+
+        Args:
+            packed (ndarray(..., board_size ** 2 // 4) or bytes): Packed boards
+            board_size ([int]): Size of the board square
+            out (ndarray(..., board_size, board_size, 2), optional): C-contiguous array written instead of a new one
+
+        Returns:
+            [ndarray(..., board_size, board_size, 2)]: Two-channels boards
+        """
+        packed = np.frombuffer(packed, dtype=np.uint8) if isinstance(packed, bytes) else np.asarray(packed)
+        if out is None:
+            out = np.empty(packed.shape[:-1] + (board_size, board_size, 2), dtype=bool)
+        elif not out.flags.c_contiguous:
+            raise ValueError('Boards are unpacked into C-contiguous arrays')
+        # Clipped indexes aren't buffered, the squares are written straight into out
+        np.take(BYTE_SQUARES, packed, axis=0, out=out.reshape(packed.shape + (8,)), mode='clip')
+        return out
 
     @staticmethod
     def invert_board(board):
         return np.flip(board, axis=2)
 
 
+class SearchState:
+    """Search node: board, player to move, disc counts and frontier squares
+
+    Children are created incrementally from the flipped pieces of the action,
+    so the disc counts and valid actions never scan the whole board.
+    """
+    __slots__ = ('board', 'player', 'points', 'frontier')
+
+    def __init__(self, board, player, points=None, frontier=None):
+        """Create a search node
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board, it's not copied
+            player ([OthelloPlayer]): Player to move
+            points ([dict], optional): Points of each player, calculated if None
+            frontier ([set], optional): Frontier square positions, calculated if None
+        """
+        self.board = board
+        self.player = player
+        self.points = points if points is not None else OthelloGame.get_board_players_points(board)
+        self.frontier = frontier if frontier is not None else OthelloGame.get_board_frontier_squares(board)
+
+    def get_valid_actions(self, player=None):
+        """Get the valid actions of a player, the player to move by default
+
+        Returns:
+            [list[(row, col), ...]]: Valid actions, in row-major order
+        """
+        player = player if player is not None else self.player
+        return OthelloGame.get_frontier_player_valid_actions(self.board, player, self.frontier)
+
+    def has_actions(self, player=None):
+        """Check if a player, the player to move by default, has any valid action
+
+        Returns:
+            [bool]: True if there's a valid action, otherwise False
+        """
+        player = player if player is not None else self.player
+        return OthelloGame.has_frontier_player_actions(self.board, player, self.frontier)
+
+    def child(self, row, col):
+        """Create the node after the player to move plays an action, passes are not handled
+
+        Args:
+            row ([int]): Piece position on row
+            col ([int]): Piece position on col
+
+        Returns:
+            [SearchState]: New node with a copy of the board, the opponent is the player to move
+        """
+        board = np.copy(self.board)
+        flip_squares = OthelloGame.flip_board_squares(board, self.player, row, col)
+        points = {
+            self.player: self.points[self.player] + len(flip_squares) + 1,
+            self.player.opponent: self.points[self.player.opponent] - len(flip_squares),
+        }
+        frontier = set(self.frontier)
+        OthelloGame.update_frontier_squares(board, frontier, row, col)
+        return SearchState(board, self.player.opponent, points, frontier)
+
+    def pass_turn(self):
+        """Give the turn to the opponent"""
+        self.player = self.player.opponent
+
+
 if __name__ == '__main__':
     board = np.array([[[False,  True],
         [False, False],
@@ -0,0 +1,192 @@
+import numpy as np
+
+from . import OthelloGame, OthelloPlayer
+
+
+# 8x8 boards as uint64 numbers, square (row, col) is the bit 8 * row + col
+BOARD_SIZE = 8
+
+FULL = np.uint64(0xffffffffffffffff)
+NOT_A_FILE = np.uint64(0xfefefefefefefefe)
+NOT_H_FILE = np.uint64(0x7f7f7f7f7f7f7f7f)
+
+# Bit shift of each direction and the mask of the squares that don't wrap to another row
+DIRECTIONS = (
+    (1, NOT_A_FILE), (-1, NOT_H_FILE),
+    (8, FULL), (-8, FULL),
+    (9, NOT_A_FILE), (-9, NOT_H_FILE),
+    (7, NOT_H_FILE), (-7, NOT_A_FILE),
+)
+
+# Lines through a square, with the squares where the line leaves the board
+AXES = (
+    (DIRECTIONS[0], DIRECTIONS[1], np.uint64(0x8181818181818181)),
+    (DIRECTIONS[2], DIRECTIONS[3], np.uint64(0xff000000000000ff)),
+    (DIRECTIONS[4], DIRECTIONS[5], np.uint64(0xff818181818181ff)),
+    (DIRECTIONS[6], DIRECTIONS[7], np.uint64(0xff818181818181ff)),
+)
+
+# The same lines stacked, to shift a bitboard in all directions at once: to the left
+# for the first direction of each line and to the right for the opposite one
+LINE_SHIFTS = np.array([[1], [8], [9], [7]], dtype=np.uint64)
+LEFT_MASKS = np.array([[NOT_A_FILE], [FULL], [NOT_A_FILE], [NOT_H_FILE]], dtype=np.uint64)
+RIGHT_MASKS = np.array([[NOT_H_FILE], [FULL], [NOT_H_FILE], [NOT_A_FILE]], dtype=np.uint64)
+LINE_BORDERS = np.array([[axis[2]] for axis in AXES], dtype=np.uint64)
+
+BYTE_BIT_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def pack_boards(boards):
+    """Convert two-channels boards to bitboards
+
+    Args:
+        boards (ndarray(..., 8, 8, 2)): Two-channels board or a batch of boards
+
+    Returns:
+        [dict]: Bitboard of each player, ndarray(n) of uint64
+    """
+    boards = np.asarray(boards, dtype=bool)
+    if boards.shape[-3:] != (BOARD_SIZE, BOARD_SIZE, 2):
+        raise ValueError(f'Bitboards are {BOARD_SIZE}x{BOARD_SIZE}, got a board of shape {boards.shape}')
+    squares = boards.reshape((-1, BOARD_SIZE ** 2, 2))
+    return {player: np.packbits(squares[:, :, channel], axis=1, bitorder='little').view('<u8').ravel()
+            for player, channel in OthelloGame.PLAYER_CHANNELS.items()}
+
+
+def unpack_boards(bitboards):
+    """Convert bitboards to two-channels boards
+
+    Args:
+        bitboards ([dict]): Bitboard of each player, ndarray(n) of uint64
+
+    Returns:
+        [ndarray(n, 8, 8, 2)]: Two-channels boards
+    """
+    count = len(bitboards[OthelloPlayer.BLACK])
+    boards = np.zeros((count, BOARD_SIZE, BOARD_SIZE, 2), dtype=bool)
+    for player, channel in OthelloGame.PLAYER_CHANNELS.items():
+        bits = np.ascontiguousarray(bitboards[player], dtype='<u8').view(np.uint8).reshape((count, 8))
+        boards[:, :, :, channel] = np.unpackbits(bits, axis=1, bitorder='little').reshape((count, BOARD_SIZE,
+                                                                                           BOARD_SIZE))
+    return boards
+
+
+def shift(bits, direction):
+    """Move every square one step in a direction, squares leaving the board are dropped"""
+    amount, mask = direction
+    if amount > 0:
+        return (bits << np.uint64(amount)) & mask
+    return (bits >> np.uint64(-amount)) & mask
+
+
+def count_bits(bits):
+    """Count the squares of bitboards
+
+    Args:
+        bits (ndarray(n)): Bitboards
+
+    Returns:
+        [ndarray(n)]: Number of squares of each bitboard
+    """
+    bits = np.ascontiguousarray(bits, dtype='<u8')
+    return BYTE_BIT_COUNTS[bits.view(np.uint8).reshape((-1, 8))].sum(axis=1, dtype=np.int64)
+
+
+def get_moves(own, opponent):
+    """Get the valid actions of a player
+
+    Args:
+        own (ndarray(n)): Bitboards of the player
+        opponent (ndarray(n)): Bitboards of the opponent
+
+    Returns:
+        [ndarray(n)]: Bitboards of the valid actions
+    """
+    empty = ~(own | opponent)
+    left_opponent = LEFT_MASKS & opponent
+    right_opponent = RIGHT_MASKS & opponent
+    left = (own << LINE_SHIFTS) & left_opponent
+    right = (own >> LINE_SHIFTS) & right_opponent
+    # At most 6 opponent pieces can be between the action and a player piece
+    for _ in range(BOARD_SIZE - 3):
+        left |= (left << LINE_SHIFTS) & left_opponent
+        right |= (right >> LINE_SHIFTS) & right_opponent
+    moves = ((left << LINE_SHIFTS) & LEFT_MASKS) | ((right >> LINE_SHIFTS) & RIGHT_MASKS)
+    return np.bitwise_or.reduce(moves, axis=0) & empty
+
+
+def get_flips(own, opponent, moves):
+    """Get the pieces flipped by actions
+
+    Args:
+        own (ndarray(n)): Bitboards of the player
+        opponent (ndarray(n)): Bitboards of the opponent
+        moves (ndarray(n)): Bitboards with the square of a valid action each
+
+    Returns:
+        [ndarray(n)]: Bitboards of the opponent pieces flipped by each action
+    """
+    left_opponent = LEFT_MASKS & opponent
+    right_opponent = RIGHT_MASKS & opponent
+    left = (moves << LINE_SHIFTS) & left_opponent
+    right = (moves >> LINE_SHIFTS) & right_opponent
+    for _ in range(BOARD_SIZE - 3):
+        left |= (left << LINE_SHIFTS) & left_opponent
+        right |= (right >> LINE_SHIFTS) & right_opponent
+    # A line of opponent pieces is flipped when a player piece closes it
+    left_closed = ((left << LINE_SHIFTS) & LEFT_MASKS & own) != 0
+    right_closed = ((right >> LINE_SHIFTS) & RIGHT_MASKS & own) != 0
+    flips = np.where(left_closed, left, np.uint64(0)) | np.where(right_closed, right, np.uint64(0))
+    return np.bitwise_or.reduce(flips, axis=0)
+
+
+def split_moves(moves):
+    """Split the valid actions of bitboards into a row per action
+
+    Args:
+        moves (ndarray(n)): Bitboards of valid actions, as get_moves
+
+    Returns:
+        [tuple]: (ndarray(m) index of the bitboard of each action, ndarray(m) bitboards with its square)
+    """
+    moves = np.ascontiguousarray(moves, dtype='<u8')
+    squares = np.unpackbits(moves.view(np.uint8).reshape((-1, 8)), axis=1, bitorder='little')
+    indexes, positions = np.nonzero(squares)
+    return indexes, np.left_shift(np.uint64(1), positions.astype(np.uint64))
+
+
+def play_actions(own, opponent, actions):
+    """Play valid actions
+
+    Args:
+        own (ndarray(n)): Bitboards of the player
+        opponent (ndarray(n)): Bitboards of the opponent
+        actions (ndarray(n)): Bitboards with the square of a valid action each
+
+    Returns:
+        [tuple]: Bitboards of the player and of the opponent after each action
+    """
+    flips = get_flips(own, opponent, actions)
+    return own | actions | flips, opponent & ~flips
+
+
+def get_stable_discs(own):
+    """Get pieces that can't be flipped anymore
+
+    A piece is stable when, on each of its lines, it's next to the board border or
+    to a stable piece of the same player. Pieces stable only because a line is full
+    are not found, so the result is a lower bound.
+
+    Args:
+        own (ndarray(n)): Bitboards of the player
+
+    Returns:
+        [ndarray(n)]: Bitboards of the stable pieces of the player
+    """
+    stable = np.zeros_like(own)
+    while True:
+        lines = ((stable << LINE_SHIFTS) & LEFT_MASKS) | ((stable >> LINE_SHIFTS) & RIGHT_MASKS) | LINE_BORDERS
+        new_stable = np.bitwise_and.reduce(lines, axis=0) & own
+        if np.array_equal(new_stable, stable):
+            return stable
+        stable = new_stable
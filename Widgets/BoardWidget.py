@@ -1,26 +1,53 @@
 import numpy as np
 
-from PIL import Image, ImageDraw
-from PIL.ImageQt import ImageQt
-
-
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import Qt
 
+from enum import Enum, auto
+
+
+class BoardRenderMode(Enum):
+    # Squares copied from board images rendered by get_board_image
+    LAYERS = auto()
+    # Squares painted directly on the widget
+    PAINTER = auto()
+
 
 class BoardWidget(QtWidgets.QWidget):
-    def __init__(self, board_size=8, size=500, *args, **kwargs):
+    BACKGROUND_COLOR = '#4ac236'
+    STROKE_COLOR = '#000000'
+    PIECE_COLORS = {1: '#000000', -1: '#ffffff'}
+    SQUARE_STROKE = 2
+    PIECE_STROKE = 2
+    PIECE_PADDING = 5
+
+    # Full board images with every square in the same state, the squares are copied
+    # from them. Key: (size, board_size, square color, piece)
+    _layers_cache = {}
+
+    def __init__(self, board_size=8, size=500, render_mode=BoardRenderMode.LAYERS, *args, **kwargs):
         super(BoardWidget, self).__init__(*args, **kwargs)
         self.setContentsMargins(0, 0, 0, 0)
         
-        self._layout = QtWidgets.QVBoxLayout()
-        self._layout.setContentsMargins(0, 0, 0, 0)
-        self._layout.setSpacing(0)
-        
         self._board = np.zeros((board_size, board_size), dtype=int)
+        self._highlight_squares = {}
         self._size = size
         self._board_size = board_size
-        board_image = self.get_board_image(self._board, self._size)
+        self._render_mode = render_mode
+
+        self._hover_square = None
+        self._hover_callback = None
+
+        if self._render_mode is BoardRenderMode.PAINTER:
+            self.setFixedSize(self._size, self._size)
+            self.setMouseTracking(True)
+            return
+
+        self._layout = QtWidgets.QVBoxLayout()
+        self._layout.setContentsMargins(0, 0, 0, 0)
+        self._layout.setSpacing(0)
+
+        self._pix_widget = QtGui.QPixmap(self._get_layer(self.BACKGROUND_COLOR, 0))
         
         self._image_label = QtWidgets.QLabel(self)
         self._layout.addWidget(self._image_label)
@@ -30,9 +57,6 @@ class BoardWidget(QtWidgets.QWidget):
         self._image_label.setMouseTracking(True)
         self._image_label.mouseMoveEvent = self._mouseMoveEvent
         self._image_label.mouseReleaseEvent = self.leaveEvent
-
-        self._hover_square = None
-        self._hover_callback = None
     
     def get_size(self):
         return self._size, self._size
@@ -41,15 +65,66 @@ class BoardWidget(QtWidgets.QWidget):
         return self._board_size
     
     def set_board(self, board, highlight_squares=None):
-        self._board = board
-        board_image = self.get_board_image(self._board, self._size, 
-                                           highlight_squares=highlight_squares)
-        self._pix_widget = QtGui.QPixmap.fromImage(ImageQt(board_image))
-        self._image_label.setPixmap(self._pix_widget)
+        highlight_squares = {tuple(int(i) for i in s): c for s, c in (highlight_squares or {}).items()}
+        dirty_squares = self._get_dirty_squares(board, highlight_squares)
+
+        self._board = np.copy(board)
+        self._highlight_squares = highlight_squares
+
+        if self._render_mode is BoardRenderMode.PAINTER:
+            margin = self.SQUARE_STROKE
+            for row, col in dirty_squares:
+                self.update(self._square_rect(row, col).adjusted(-margin, -margin, margin, margin))
+        elif dirty_squares or self._image_label.pixmap() is None:
+            painter = QtGui.QPainter(self._pix_widget)
+            for row, col in dirty_squares:
+                self._draw_square(painter, row, col)
+            painter.end()
+            self._image_label.setPixmap(self._pix_widget)
     
     def register_square_hover_callback(self, callback):
         self._hover_callback = callback
 
+    def paintEvent(self, event):
+        if self._render_mode is not BoardRenderMode.PAINTER:
+            return super().paintEvent(event)
+
+        painter = QtGui.QPainter(self)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        stroke_color = QtGui.QColor(self.STROKE_COLOR)
+        square_pen = QtGui.QPen(stroke_color, self.SQUARE_STROKE)
+        piece_pen = QtGui.QPen(stroke_color, self.PIECE_STROKE)
+
+        square_size = self._size / self._board_size
+        exposed_rect = event.rect()
+        for row in range(self._board_size):
+            for col in range(self._board_size):
+                if not exposed_rect.intersects(self._square_rect(row, col)):
+                    continue
+                square_rect = QtCore.QRectF(col * square_size, row * square_size, square_size, square_size)
+                color = self._highlight_squares.get((row, col), self.BACKGROUND_COLOR)
+                painter.setPen(square_pen)
+                painter.setBrush(QtGui.QColor(color))
+                painter.drawRect(square_rect)
+
+                piece = int(self._board[row, col])
+                if piece != 0:
+                    padding = self.PIECE_PADDING
+                    painter.setPen(piece_pen)
+                    painter.setBrush(QtGui.QColor(self.PIECE_COLORS[piece]))
+                    painter.drawEllipse(square_rect.adjusted(padding, padding, -padding, -padding))
+
+        # Board border
+        painter.setPen(square_pen)
+        painter.setBrush(Qt.NoBrush)
+        half_stroke = self.SQUARE_STROKE / 2
+        painter.drawRect(QtCore.QRectF(half_stroke, half_stroke, self._size - self.SQUARE_STROKE,
+                                       self._size - self.SQUARE_STROKE))
+        painter.end()
+
+    def mouseMoveEvent(self, event):
+        self._mouseMoveEvent(event)
+
     def _mouseMoveEvent(self, event):
         col =  event.x() // (self._size // self._board_size)
         row = event.y() // (self._size // self._board_size)
@@ -62,10 +137,44 @@ class BoardWidget(QtWidgets.QWidget):
         self._hover_square = None
         self._hover_callback(self._hover_square)
 
+    def _get_dirty_squares(self, board, highlight_squares):
+        dirty_squares = {tuple(s) for s in np.argwhere(board != self._board)}
+        for square in self._highlight_squares.keys() | highlight_squares.keys():
+            if self._highlight_squares.get(square) != highlight_squares.get(square):
+                dirty_squares.add(square)
+        return dirty_squares
+
+    def _draw_square(self, painter, row, col):
+        color = self._highlight_squares.get((row, col), self.BACKGROUND_COLOR)
+        layer = self._get_layer(color, int(self._board[row, col]))
+        square_rect = self._square_rect(row, col)
+        painter.drawPixmap(square_rect, layer, square_rect)
+
+    def _square_rect(self, row, col):
+        square_size = self._size / self._board_size
+        x1, y1 = round(col * square_size), round(row * square_size)
+        x2, y2 = round((col + 1) * square_size), round((row + 1) * square_size)
+        return QtCore.QRect(x1, y1, x2 - x1, y2 - y1)
+
+    def _get_layer(self, color, piece):
+        key = self._size, self._board_size, color, piece
+        if key not in BoardWidget._layers_cache:
+            board = np.full((self._board_size, self._board_size), piece, dtype=int)
+            highlight_squares = {(row, col): color for row in range(self._board_size)
+                                 for col in range(self._board_size)}
+            image = self.get_board_image(board, self._size, background_color=self.BACKGROUND_COLOR,
+                                         highlight_squares=highlight_squares)
+            # Imported on the first layer drawn, PIL isn't needed to build the widget
+            from PIL.ImageQt import ImageQt
+            BoardWidget._layers_cache[key] = QtGui.QPixmap.fromImage(ImageQt(image))
+        return BoardWidget._layers_cache[key]
+
     @staticmethod
     def get_board_image(board, size, background_color='#4ac236', square_stroke=2, 
                         piece_stroke=2, stroke_color='#000000', piece_white_color='#ffffff', 
                         piece_black_color='#000000', highlight_squares=None):
+        from PIL import Image, ImageDraw
+
         rows, cols = board.shape
         image = Image.new(mode='RGBA', size=(size, size))
         draw = ImageDraw.Draw(image)
@@ -22,17 +22,37 @@ class FloatingDialogWidget(QtWidgets.QWidget):
         super(FloatingDialogWidget, self).__init__(*args, **kwargs)
 
         self._text = ''
+        self._static_texts = []
         self._alignment = FloatingDialogAlignment.BOTTOM_LEFT
         self._padding = padding
         self._line_margin = line_margin
         self._stroke_width = 1
+        self._size = self.measure_text(self._text)
         
         self._pen = QtGui.QPen(QtGui.QColor(0, 0, 0))
         self._pen.setWidth(self._stroke_width)
         self._brush = QtGui.QBrush(QtGui.QColor(255, 255, 255, 255))
         
-    def set_text(self, text):
+    def set_text(self, text, size=None):
+        """Set the dialog text
+
+        Args:
+            text ([str]): Text of the dialog
+            size ([tuple], optional): Dialog size given by measure_text, if None it's measured
+        """
+        if text == self._text:
+            return
         self._text = text
+        # Only the lines that changed are prepared again
+        lines = text.splitlines()
+        del self._static_texts[len(lines):]
+        for i, line in enumerate(lines):
+            if i == len(self._static_texts):
+                self._static_texts.append(QtGui.QStaticText())
+            if self._static_texts[i].text() != line:
+                self._static_texts[i].setText(line)
+        self._size = size or self.measure_text(text)
+        self._update_fixed_size()
         self.update()
     
     def set_alignment(self, alignment):
@@ -48,16 +68,12 @@ class FloatingDialogWidget(QtWidgets.QWidget):
         painter.setBrush(self._brush)
         painter.drawPolygon(self._out_box_polygon())
         padding = self._padding + self._stroke_width
-        lines = self._text.splitlines()
         text_y = 0
         if self._alignment in (FloatingDialogAlignment.TOP_LEFT, FloatingDialogAlignment.TOP_RIGHT):
             text_y = self.TRIANGLE_WIDTH
-        for i, line in enumerate(lines):
-            static_text = QtGui.QStaticText()
-            static_text.setText(line)
-            line_total_height = self.LINE_HEIGHT + self._line_margin
+        line_total_height = self.LINE_HEIGHT + self._line_margin
+        for i, static_text in enumerate(self._static_texts):
             painter.drawStaticText(QtCore.QPoint(padding, text_y + padding + i * line_total_height), static_text)
-        self._update_fixed_size()
     
     def move(self, x, y):
         if self._alignment is FloatingDialogAlignment.TOP_RIGHT:
@@ -105,7 +121,18 @@ class FloatingDialogWidget(QtWidgets.QWidget):
         return polygon
 
     def get_size(self):
-        lines = self._text.splitlines()
+        return self._size
+
+    def measure_text(self, text):
+        """Get the size of the dialog showing a text
+
+        Args:
+            text ([str]): Text of the dialog
+
+        Returns:
+            [tuple]: Dialog (width, height)
+        """
+        lines = text.splitlines()
         max_string = (lines or '') and max(lines, key=len)
         width = self._padding * 2 + len(max_string) * self.CHAR_WIDTH + self._stroke_width * 2
         height = self._padding * 2 + len(lines) * (self.LINE_HEIGHT + self._line_margin) + self._stroke_width * 2
@@ -1,9 +1,3 @@
-import numpy as np
-
-from PIL import Image, ImageDraw
-from PIL.ImageQt import ImageQt
-
-
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import Qt
 
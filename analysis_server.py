@@ -0,0 +1,426 @@
+import sys
+import json
+import time
+import heapq
+import argparse
+import itertools
+
+from threading import Thread, Condition, Lock
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Othello import OthelloGame, OthelloPlayer
+from move_analysis import normalize_lottery, get_best_action
+from shared_pool import SharedAnalysisPool
+from perft import parse_board_string
+from game_records import format_move
+
+
+DEFAULT_PORT = 8064
+MAX_DEPTH_LEVEL = 10
+PLAYERS = {'black': OthelloPlayer.BLACK, 'white': OthelloPlayer.WHITE}
+
+
+class ServerMetrics:
+    """Counters of the requests, and the time the computed positions waited in the queue and ran"""
+    COUNTERS = ('requests', 'cache_hits', 'coalesced', 'computed', 'expired', 'dropped', 'failed')
+    TIMES = ('queue_time', 'compute_time')
+
+    def __init__(self):
+        self._lock = Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        # Count, total and maximum of each time
+        self.times = {name: [0, 0.0, 0.0] for name in self.TIMES}
+
+    def increment(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            times = self.times[name]
+            times[0] += 1
+            times[1] += seconds
+            times[2] = max(times[2], seconds)
+
+    def snapshot(self):
+        """Get the metrics as a JSON serializable dict, times in seconds"""
+        with self._lock:
+            metrics = dict(self.counters)
+            for name, (count, total, maximum) in self.times.items():
+                metrics[name] = {'mean': total / count if count else 0.0, 'max': maximum, 'total': total}
+            return metrics
+
+
+class AnalysisJob:
+    """Lotteries of a position, shared by the identical requests waiting for them"""
+
+    def __init__(self, key, board, player, depth, priority=0):
+        self.key = key
+        self.board = board
+        self.player = player
+        self.depth = depth
+        self.priority = priority
+        self.is_queued = True
+        # Sequence of its queue entry, a job put back in the queue keeps its place
+        self.sequence = None
+        self.future = Future()
+        self.waiters = 0
+        self.lotteries = {}
+        self.actions = None
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+
+
+class AnalysisServer:
+    """Analyse positions for any number of clients with a worker pool and a result cache
+
+    Requests of a position already being analysed wait for the same job instead of
+    starting another. Jobs waiting in the queue are taken in batches, the highest
+    priority first, and the analyses of all their actions keep every slot of the
+    pool busy. A job gets the highest priority of its requests. Jobs whose requests
+    all gave up before they started are dropped.
+
+    The queue is checked again before each action is sent to the pool. When a job
+    of higher priority is waiting, the actions of the batch not sent yet are put
+    back in the queue with their jobs, and the next batch starts once the running
+    actions finish.
+    """
+
+    def __init__(self, processes=None, cache_size=4096, max_batch_size=64, batch_window=0.005, pool=None):
+        """Start the pool and the dispatcher thread
+
+        Args:
+            processes ([int], optional): Number of worker processes, if None use the CPU count
+            cache_size ([int]): Number of positions kept in the cache, the least recently used are evicted
+            max_batch_size ([int]): Maximum number of jobs in a batch
+            batch_window ([float]): Seconds waited after a job arrives, so others join its batch
+            pool ([SharedAnalysisPool], optional): Pool used instead of starting one
+        """
+        self.pool = pool or SharedAnalysisPool(processes)
+        self.cache_size = cache_size
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.metrics = ServerMetrics()
+
+        self._condition = Condition()
+        self._cache = OrderedDict()
+        self._jobs = {}
+        # Heap of (-priority, sequence, job), a job raised to a higher priority is pushed again
+        self._pending = []
+        self._sequence = itertools.count()
+        self._queued = 0
+        self._is_closed = False
+        self._thread = Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+
+    def analyse(self, board, player, depth, timeout=None, priority=0):
+        """Get the lotteries of a position, from the cache or waiting for its job
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board
+            player ([OthelloPlayer]): Player to move
+            depth ([int]): Depth of the analysis
+            timeout ([float], optional): Seconds to wait, if None wait until the job finishes
+            priority ([int]): Jobs of higher priority are taken from the queue first
+
+        Returns:
+            [tuple]: ([dict] normalized lottery of each valid action, [dict] how the request was answered:
+                cached, coalesced, queue_time and compute_time)
+
+        Raises:
+            TimeoutError: The deadline passed before the job finished
+        """
+        future = self.submit(board, player, depth, priority)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self.metrics.increment('expired')
+            raise TimeoutError(f'Analysis not finished after {timeout}s') from None
+
+    def submit(self, board, player, depth, priority=0):
+        """Request the lotteries of a position without waiting for them
+
+        Returns:
+            [Future]: Result of analyse, cancel it when the lotteries are no longer wanted
+        """
+        self.metrics.increment('requests')
+        key = OthelloGame.pack_board(board).tobytes(), player.value, depth
+        future = Future()
+        with self._condition:
+            if self._is_closed:
+                raise RuntimeError('The analysis server is closed')
+            lotteries = self._cache.get(key)
+            if lotteries is not None:
+                self._cache.move_to_end(key)
+                self.metrics.increment('cache_hits')
+                future.set_result((lotteries, {'cached': True, 'coalesced': False, 'queue_time': 0.0,
+                                               'compute_time': 0.0}))
+                return future
+
+            job = self._jobs.get(key)
+            coalesced = job is not None
+            if coalesced:
+                self.metrics.increment('coalesced')
+                if job.is_queued and priority > job.priority:
+                    job.priority = priority
+                    self._push_job(job, next(self._sequence))
+            else:
+                job = self._jobs[key] = AnalysisJob(key, board.copy(), player, depth, priority)
+                self._push_job(job, next(self._sequence))
+                self._queued += 1
+                self._condition.notify()
+            job.waiters += 1
+
+        # The job keeps a waiter until the request is answered or cancelled
+        future.add_done_callback(lambda _: self._release_job(job))
+        job.future.add_done_callback(lambda job_future: self._answer(future, job, job_future, coalesced))
+        return future
+
+    def get_metrics(self):
+        metrics = self.metrics.snapshot()
+        with self._condition:
+            metrics.update(queued=self._queued, running=len(self._jobs) - self._queued, cached=len(self._cache))
+        return metrics
+
+    def close(self):
+        """Stop the dispatcher and the pool, the jobs not started fail"""
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify()
+        self._thread.join()
+        for job in self._pop_jobs(len(self._pending)):
+            job.future.set_exception(RuntimeError('The analysis server was closed'))
+        self.pool.close()
+
+    def _release_job(self, job):
+        with self._condition:
+            job.waiters -= 1
+
+    @staticmethod
+    def _answer(future, job, job_future, coalesced):
+        if not future.set_running_or_notify_cancel():
+            return
+        if job_future.exception() is not None:
+            future.set_exception(job_future.exception())
+        else:
+            future.set_result((job_future.result(), {'cached': False, 'coalesced': coalesced,
+                                                     'queue_time': job.started - job.submitted,
+                                                     'compute_time': job.finished - job.started}))
+
+    def _push_job(self, job, sequence):
+        job.sequence = sequence
+        heapq.heappush(self._pending, (-job.priority, sequence, job))
+
+    def _pop_jobs(self, count):
+        """Take up to count queued jobs, the highest priority first"""
+        jobs = []
+        while self._pending and len(jobs) < count:
+            priority, _, job = heapq.heappop(self._pending)
+            # Entries of a job raised to a higher priority, or already taken, are skipped
+            if job.is_queued and -priority == job.priority:
+                job.is_queued = False
+                self._queued -= 1
+                jobs.append(job)
+        return jobs
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while not self._queued and not self._is_closed:
+                    self._condition.wait()
+                if self._is_closed:
+                    return
+            time.sleep(self.batch_window)
+
+            jobs = []
+            with self._condition:
+                while self._queued and len(jobs) < self.max_batch_size:
+                    for job in self._pop_jobs(self.max_batch_size - len(jobs)):
+                        if job.waiters > 0:
+                            jobs.append(job)
+                        else:
+                            # Every request of the job has expired, a new request starts another
+                            del self._jobs[job.key]
+                            job.future.set_exception(TimeoutError('Analysis dropped, no request waits for it'))
+                            self.metrics.increment('dropped')
+            if jobs:
+                self._run_batch(jobs)
+
+    def _get_top_priority(self):
+        """Get the priority of the first job in the queue, None if it's empty"""
+        with self._condition:
+            while self._pending:
+                priority, _, job = self._pending[0]
+                if job.is_queued and -priority == job.priority:
+                    return job.priority
+                heapq.heappop(self._pending)
+            return None
+
+    def _run_batch(self, jobs):
+        started = time.perf_counter()
+        for job in jobs:
+            # A job put back in the queue keeps the lotteries of its actions already analysed
+            if job.started is None:
+                job.started = started
+                self.metrics.add_time('queue_time', started - job.submitted)
+                job.actions = list(OthelloGame.get_player_actions_gains(job.board, job.player))
+            if not job.actions:
+                self._finish_job(job)
+
+        # Actions sent to the pool, in the order of their histograms
+        sent = deque()
+        preempted = []
+
+        def get_tasks():
+            for index, job in enumerate(jobs):
+                for action in job.actions:
+                    if action in job.lotteries:
+                        continue
+                    top_priority = self._get_top_priority()
+                    if top_priority is not None and top_priority > job.priority:
+                        preempted.extend(jobs[index:])
+                        return
+                    sent.append((job, action))
+                    yield job.board, job.player, action, job.depth
+
+        try:
+            for histogram in self.pool.imap(get_tasks()):
+                job, action = sent.popleft()
+                job.lotteries[action] = normalize_lottery(self.pool.get_points(histogram))
+                if len(job.lotteries) == len(job.actions):
+                    self._finish_job(job)
+        except Exception as e:
+            for job in jobs:
+                if not job.future.done():
+                    self.metrics.increment('failed')
+                    with self._condition:
+                        del self._jobs[job.key]
+                    job.future.set_exception(e)
+            return
+
+        with self._condition:
+            for job in preempted:
+                if not job.future.done():
+                    job.is_queued = True
+                    self._push_job(job, job.sequence)
+                    self._queued += 1
+
+    def _finish_job(self, job):
+        job.finished = time.perf_counter()
+        self.metrics.add_time('compute_time', job.finished - job.started)
+        self.metrics.increment('computed')
+        with self._condition:
+            del self._jobs[job.key]
+            self._cache[job.key] = job.lotteries
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        job.future.set_result(job.lotteries)
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """JSON API of the analysis server
+
+    POST /analyse with {"board": squares, "player": "black" or "white", "depth": int,
+    "deadline": seconds, "risk": factor, "priority": int} answers the lotteries and best
+    action of the position. GET /metrics answers the server metrics.
+    """
+    server_version = 'OthelloAnalysis/1.0'
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_json(200, self.server.analysis_server.get_metrics())
+        else:
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/analyse':
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            board = parse_board_string(request['board'])
+            player = PLAYERS[request.get('player', 'black')]
+            depth = int(request.get('depth', 2))
+            if not 0 <= depth <= self.server.max_depth:
+                raise ValueError(f'Depth must be between 0 and {self.server.max_depth}')
+            deadline = request.get('deadline')
+            deadline = float(deadline) if deadline is not None else None
+            exponential_utility_factor = int(request.get('risk', 0))
+            priority = int(request.get('priority', 0))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': f'Invalid request: {e!r}'})
+            return
+
+        try:
+            lotteries, answer = self.server.analysis_server.analyse(board, player, depth, deadline, priority)
+        except TimeoutError as e:
+            self._send_json(504, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': repr(e)})
+            return
+
+        best_action = get_best_action(lotteries, exponential_utility_factor) if lotteries else None
+        self._send_json(200, dict(answer, **{
+            'best_action': best_action and format_move(best_action),
+            'lotteries': {format_move(a): {f'{p:+}': probability for p, probability in sorted(lottery.items())}
+                          for a, lottery in lotteries.items()},
+        }))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, content):
+        data = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def create_http_server(analysis_server, host='127.0.0.1', port=DEFAULT_PORT, max_depth=MAX_DEPTH_LEVEL,
+                       verbose=False):
+    """Create the HTTP server of an analysis server, a thread per connection
+
+    Returns:
+        [ThreadingHTTPServer]: Server, run it with serve_forever
+    """
+    http_server = ThreadingHTTPServer((host, port), AnalysisRequestHandler)
+    http_server.daemon_threads = True
+    http_server.analysis_server = analysis_server
+    http_server.max_depth = max_depth
+    http_server.verbose = verbose
+    return http_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Othello position analyses over HTTP/JSON')
+    parser.add_argument('--host', default='127.0.0.1', help='Address of the server')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port of the server')
+    parser.add_argument('--processes', type=int, help='Number of worker processes, CPU count by default')
+    parser.add_argument('--cache-size', type=int, default=4096, help='Number of positions kept in the cache')
+    parser.add_argument('--max-depth', type=int, default=MAX_DEPTH_LEVEL, help='Deepest analysis accepted')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    analysis_server = AnalysisServer(args.processes, args.cache_size)
+    http_server = create_http_server(analysis_server, args.host, args.port, args.max_depth, args.verbose)
+    print(f'serving on http://{args.host}:{http_server.server_address[1]}', file=sys.stderr)
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.server_close()
+        analysis_server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import itertools
+
+from threading import Thread, Event, Condition
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from Othello import OthelloGame
+from move_analysis import MoveAnalysis, normalize_lottery
+from search import SearchEngine
+from evaluation import PatternEvaluator
+from search_statistics import SearchStatistics
+
+
+class CancellationToken:
+    """Cancellation flag of a request, with callbacks to stop the work in progress"""
+
+    def __init__(self):
+        self._event = Event()
+        self._callbacks = []
+
+    def cancel(self):
+        self._event.set()
+        for callback in list(self._callbacks):
+            callback()
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def add_callback(self, callback):
+        """Register a function called on cancel, it's called at once if already cancelled"""
+        self._callbacks.append(callback)
+        if self.is_cancelled():
+            callback()
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+
+class AnalysisRequest:
+    """Lotteries of every valid action of a position, or its best action if there's a search mode"""
+
+    def __init__(self, request_id, state, player, depth_level, search_mode=None, exponential_utility_factor=0,
+                 pattern_evaluation=False, log_statistics=False, position_key=None):
+        self.id = request_id
+        self.state = state
+        self.player = player
+        self.position_key = position_key if position_key is not None else (OthelloGame.pack_board(state).tobytes(), player.value)
+        self.depth_level = depth_level
+        self.search_mode = search_mode
+        self.exponential_utility_factor = exponential_utility_factor
+        self.pattern_evaluation = pattern_evaluation
+        self.log_statistics = log_statistics
+        self.token = CancellationToken()
+        self.statistics = SearchStatistics()
+
+
+class AnalysisService(QObject):
+    """Run the analysis requests on a worker thread, one at a time
+
+    A new request cancels the one running and replaces the one waiting, so only
+    the latest position is analysed. Results are delivered through Qt signals,
+    which are queued to the thread of the connected slots.
+
+    The analyses of the last position are kept, so a request of the same position
+    at another depth reuses the depths already analysed.
+    """
+    # request id, lotteries or SearchResult
+    finished = pyqtSignal(int, object)
+    # request id, SearchResult of an iteration
+    progress = pyqtSignal(int, object)
+    # request id
+    cancelled = pyqtSignal(int)
+
+    def __init__(self, log_statistics=False, parent=None):
+        super().__init__(parent)
+        self._log_statistics = log_statistics
+        self._ids = itertools.count(1)
+        self._condition = Condition()
+        self._pending_request = None
+        self._running_request = None
+        self._is_shutdown = False
+        # Analyses of the last position by action, only used by the worker thread
+        self._position_key = None
+        self._position_analyses = {}
+        # Search engines by mode and evaluation, their transposition tables are kept between requests
+        self._engines = {}
+        self._evaluator = None
+        self._thread = Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def request(self, state, player, depth_level, search_mode=None, exponential_utility_factor=0,
+                pattern_evaluation=False, position_key=None):
+        """Analyse a position, superseding the previous requests
+
+        Args:
+            state (ndarray(board_size, board_size, 2)): Two-channels board, it's copied
+            player ([OthelloPlayer]): Player to move
+            depth_level ([int]): Depth of the analysis
+            search_mode ([SearchMode], optional): Search the best action instead of calculating the lotteries
+            exponential_utility_factor ([int]): Risk factor of the search leaves utility
+            pattern_evaluation ([bool]): Evaluate the search leaves with the pattern tables
+            position_key ([tuple], optional): Key of the position, like a game path, the board bytes if None
+
+        Returns:
+            [AnalysisRequest]: Request, its statistics are updated while it runs
+        """
+        request = AnalysisRequest(next(self._ids), state.copy(), player, depth_level, search_mode,
+                                  exponential_utility_factor, pattern_evaluation, self._log_statistics, position_key)
+        with self._condition:
+            self._cancel_requests()
+            self._pending_request = request
+            self._condition.notify()
+        return request
+
+    def cancel(self):
+        """Cancel the running and waiting requests"""
+        with self._condition:
+            self._cancel_requests()
+
+    def shutdown(self, wait=True):
+        """Cancel the requests and stop the worker thread"""
+        with self._condition:
+            self._cancel_requests()
+            self._is_shutdown = True
+            self._condition.notify()
+        if wait:
+            self._thread.join()
+
+    def _cancel_requests(self):
+        for request in (self._pending_request, self._running_request):
+            if request is not None and not request.token.is_cancelled():
+                request.token.cancel()
+                self.cancelled.emit(request.id)
+        self._pending_request = None
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while self._pending_request is None and not self._is_shutdown:
+                    self._condition.wait()
+                if self._is_shutdown:
+                    return
+                request, self._pending_request = self._pending_request, None
+                self._running_request = request
+
+            result = self._run_request(request)
+
+            with self._condition:
+                self._running_request = None
+                if result is not None and not request.token.is_cancelled():
+                    self.finished.emit(request.id, result)
+
+    def _get_analysis(self, request, action):
+        if request.position_key != self._position_key:
+            self._position_key = request.position_key
+            self._position_analyses = {}
+
+        analysis = self._position_analyses.get(action)
+        if analysis is None:
+            analysis = MoveAnalysis(request.state, action, request.player, request.depth_level)
+            self._position_analyses[action] = analysis
+        analysis.statistics = request.statistics
+        analysis.log_statistics = request.log_statistics
+        analysis.resume()
+        return analysis
+
+    def _run_request(self, request):
+        if request.search_mode is not None:
+            return self._run_search(request)
+
+        request.statistics.start()
+        lotteries = {}
+        try:
+            for action in OthelloGame.get_player_actions_gains(request.state, request.player):
+                if request.token.is_cancelled():
+                    return None
+                analysis = self._get_analysis(request, action)
+                request.token.add_callback(analysis.stop)
+                try:
+                    lottery = analysis.analyse(request.depth_level)
+                finally:
+                    request.token.remove_callback(analysis.stop)
+                if not lottery:
+                    return None
+                lotteries[action] = normalize_lottery(lottery)
+            return lotteries
+        finally:
+            request.statistics.stop()
+            if request.log_statistics:
+                request.statistics.log('lotteries', depth=request.depth_level, actions=len(lotteries),
+                                       completed=not request.token.is_cancelled())
+
+    def _run_search(self, request):
+        engine_key = request.search_mode, request.pattern_evaluation
+        engine = self._engines.get(engine_key)
+        if engine is None:
+            if request.pattern_evaluation and self._evaluator is None:
+                self._evaluator = PatternEvaluator.load()
+            evaluator = self._evaluator if request.pattern_evaluation else None
+            engine = self._engines[engine_key] = SearchEngine(request.search_mode, evaluator=evaluator)
+        engine.exponential_utility_factor = request.exponential_utility_factor
+        engine.statistics = request.statistics
+        engine.resume()
+
+        request.token.add_callback(engine.stop)
+        try:
+            result = engine.search(request.state, request.player, request.depth_level,
+                                   callback=lambda r: self.progress.emit(request.id, r))
+        finally:
+            request.token.remove_callback(engine.stop)
+            if request.log_statistics:
+                request.statistics.log('search', mode=request.search_mode.name.lower(), depth=request.depth_level,
+                                       patterns=request.pattern_evaluation,
+                                       completed=not request.token.is_cancelled())
+        return result
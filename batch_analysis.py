@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from game_records import read_game_records, replay_game, format_move
+from move_analysis import analyse_position, get_best_action
+
+
+def iter_positions(paths, board_size=8):
+    """Read the positions of every game of the files, lazily
+
+    Games with an invalid move are reported on stderr and their following positions are skipped.
+
+    Args:
+        paths ([list]): Paths of WTHOR or move list files
+        board_size ([int]): Size of the board square
+
+    Yields:
+        [tuple]: ([str] source, [int] game index, [Position] position)
+    """
+    for path in paths:
+        for record in read_game_records(path):
+            try:
+                for position in replay_game(record.squares, board_size):
+                    yield record.source, record.index, position
+            except ValueError as e:
+                print(f'{record.source}: game {record.index}: {e}', file=sys.stderr)
+
+
+def analyse_record_position(source, game_index, position, depth, exponential_utility_factor):
+    """Calculate the lotteries and best action of a game position
+
+    Returns:
+        [dict]: JSON serializable result
+    """
+    lotteries = analyse_position(position.board, position.player, depth)
+    return format_position_result(source, game_index, position, lotteries, exponential_utility_factor)
+
+
+def format_position_result(source, game_index, position, lotteries, exponential_utility_factor):
+    """Get the JSON serializable result of a game position from its lotteries
+
+    Returns:
+        [dict]: Position, lotteries and best action
+    """
+    best_action = get_best_action(lotteries, exponential_utility_factor) if lotteries else None
+    return {
+        'source': source,
+        'game': game_index,
+        'ply': position.ply,
+        'player': position.player.name.lower(),
+        'move': format_move(position.move),
+        'best_action': best_action and format_move(best_action),
+        'lotteries': {format_move(a): {f'{p:+}': probability for p, probability in sorted(lottery.items())}
+                      for a, lottery in lotteries.items()},
+    }
+
+
+def run_batch(paths, output, depth, exponential_utility_factor=0, processes=None, max_pending=None):
+    """Analyse every position of the games and write a JSON line per position, in input order
+
+    At most max_pending positions are submitted to the pool at a time, so the memory
+    doesn't grow with the number of games.
+
+    Args:
+        paths ([list]): Paths of WTHOR or move list files
+        output ([file]): Text file where the results are written
+        depth ([int]): Depth of the analysis
+        exponential_utility_factor ([int]): Risk factor used to choose the best action
+        processes ([int], optional): Number of worker processes, if None use the CPU count
+        max_pending ([int], optional): Positions waiting for a result, by default 4 per process
+
+    Returns:
+        [int]: Number of positions analysed
+    """
+    count = 0
+    pending = deque()
+    max_pending = max_pending or (processes or os.cpu_count()) * 4
+    with ProcessPoolExecutor(processes) as executor:
+        for source, game_index, position in iter_positions(paths):
+            pending.append(executor.submit(analyse_record_position, source, game_index, position,
+                                           depth, exponential_utility_factor))
+            if len(pending) >= max_pending:
+                output.write(json.dumps(pending.popleft().result()) + '\n')
+                count += 1
+
+        while pending:
+            output.write(json.dumps(pending.popleft().result()) + '\n')
+            count += 1
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyse every position of archived Othello games')
+    parser.add_argument('paths', nargs='+', help='WTHOR (.wtb) files or text files with a move list per line')
+    parser.add_argument('--output', '-o', default='-', help='JSON lines output file, - for stdout')
+    parser.add_argument('--depth', type=int, default=2, help='Depth level of the analysis')
+    parser.add_argument('--risk', type=int, default=0, help='Exponential utility factor, from -150 to 150')
+    parser.add_argument('--processes', type=int, help='Number of worker processes, CPU count by default')
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    start = time.perf_counter()
+    try:
+        count = run_batch(args.paths, output, args.depth, args.risk, args.processes)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(f'{count} positions analysed in {elapsed:.1f}s ({count / elapsed:.1f} positions/s)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,550 @@
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import argparse
+import itertools
+import multiprocessing
+
+from threading import Thread, Condition, Event, Lock
+from collections import deque
+
+from Othello import OthelloGame, OthelloPlayer, SearchState
+from move_analysis import MoveAnalysis, normalize_lottery, get_lottery_utility
+from perft import parse_board_string, format_board_string
+
+
+DEFAULT_PORT = 5064
+# Messages are JSON objects preceded by their size, a 4 bytes big-endian unsigned int
+MESSAGE_HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+# Seconds between two heartbeats of a worker, and without any message before it's dropped
+HEARTBEAT_INTERVAL = 1.0
+HEARTBEAT_TIMEOUT = 5.0
+# Depth where the tree of a move is split, and number of its leaves in a task
+SPLIT_DEPTH = 2
+LEAVES_PER_TASK = 32
+
+
+def send_message(sock, message):
+    """Send a JSON message with its size prefix"""
+    data = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    sock.sendall(MESSAGE_HEADER.pack(len(data)) + data)
+
+
+def receive_message(sock):
+    """Receive a message sent by send_message
+
+    Returns:
+        [dict]: Message, None if the connection was closed between two messages
+
+    Raises:
+        ConnectionError: The connection was closed in the middle of a message
+        ValueError: The message is too large or isn't valid JSON
+    """
+    header = _receive_bytes(sock, MESSAGE_HEADER.size)
+    if header is None:
+        return None
+    size, = MESSAGE_HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError(f'Message of {size} bytes, the maximum is {MAX_MESSAGE_SIZE} bytes')
+    data = _receive_bytes(sock, size)
+    if data is None:
+        raise ConnectionError('Connection closed in the middle of a message')
+    return json.loads(data.decode('utf-8'))
+
+
+def _receive_bytes(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            if data:
+                raise ConnectionError('Connection closed in the middle of a message')
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def _shutdown_socket(sock):
+    # Wakes up the threads blocked on the socket, they see the connection closed
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def run_task(task):
+    """Run a task of the coordinator
+
+    A 'subtree' task counts the lines through some leaves of the tree of a move, a
+    'position' task calculates the points of every valid action of a position.
+
+    Returns:
+        [list]: JSON serializable result, [points difference, lines] pairs of a subtree,
+            [row, col, pairs] of each action of a position
+    """
+    board = parse_board_string(task['board'])
+    player = OthelloPlayer(task['player'])
+    if task['kind'] == 'subtree':
+        analysis = MoveAnalysis(board, tuple(task['action']), player, task['depth'])
+        leaves = [(SearchState(parse_board_string(leaf_board), OthelloPlayer(leaf_player)), lines)
+                  for leaf_board, leaf_player, lines in task['leaves']]
+        return _get_points_pairs(analysis.expand_leaves(leaves, task['split_depth'], task['depth']))
+    if task['kind'] == 'position':
+        result = []
+        for row, col in OthelloGame.get_player_actions_gains(board, player):
+            analysis = MoveAnalysis(board, (row, col), player, task['depth'])
+            analysis.run()
+            result.append([int(row), int(col), _get_points_pairs(analysis.get_result())])
+        return result
+    raise ValueError(f'Unknown task kind {task["kind"]!r}')
+
+
+def _get_points_pairs(points):
+    return [[int(points_delta), int(lines)] for points_delta, lines in sorted(points.items())]
+
+
+def _add_points_pairs(points, pairs):
+    for points_delta, lines in pairs:
+        points[points_delta] = points.get(points_delta, 0) + lines
+    return points
+
+
+class WorkerConnection:
+    """Connection of a worker, with the tasks sent to it and not finished"""
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.name = f'{address[0]}:{address[1]}'
+        self.task_ids = set()
+        self.last_message = time.monotonic()
+        # Tasks are only sent after its hello, and no more once its connection failed
+        self.is_ready = False
+
+
+class Coordinator:
+    """Hand out analysis tasks to the workers connected over TCP and collect their results
+
+    Each worker has at most tasks_per_worker tasks at a time. A worker that closes its
+    connection or misses its heartbeats is dropped, and its tasks go back to the front
+    of the queue. A task may then be run twice, only its first result is kept.
+    """
+
+    def __init__(self, host='0.0.0.0', port=DEFAULT_PORT, heartbeat_timeout=HEARTBEAT_TIMEOUT, tasks_per_worker=2):
+        """Start listening to workers
+
+        Args:
+            host ([str]): Address of the server socket
+            port ([int]): Port of the server socket, 0 for any free port
+            heartbeat_timeout ([float]): Seconds without a message of a worker before it's dropped
+            tasks_per_worker ([int]): Tasks sent to a worker before it returns their results
+        """
+        self._server = socket.create_server((host, port))
+        self.address = self._server.getsockname()[:2]
+        self.heartbeat_timeout = heartbeat_timeout
+        self.tasks_per_worker = tasks_per_worker
+        self.requeued_tasks = 0
+        self.duplicate_results = 0
+
+        self._condition = Condition()
+        self._ids = itertools.count()
+        # Tasks not finished by id, and the ids of the tasks waiting for a worker
+        self._tasks = {}
+        self._pending = deque()
+        # Finished tasks not gathered yet, (error, result) by id
+        self._results = {}
+        self._workers = set()
+        self._close_event = Event()
+
+        Thread(target=self._accept_workers, daemon=True).start()
+        Thread(target=self._check_heartbeats, daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_worker_count(self):
+        with self._condition:
+            return sum(1 for worker in self._workers if worker.is_ready)
+
+    def submit(self, task):
+        """Queue a task
+
+        Args:
+            task ([dict]): JSON serializable task, as run by run_task
+
+        Returns:
+            [int]: Id of the task
+        """
+        with self._condition:
+            task_id = next(self._ids)
+            self._tasks[task_id] = task
+            self._pending.append(task_id)
+            self._dispatch()
+        return task_id
+
+    def gather(self, task_ids, timeout=None):
+        """Wait for the results of tasks, they're removed from the coordinator
+
+        Args:
+            task_ids ([list]): Ids of the tasks
+            timeout ([float], optional): Seconds to wait, if None wait until they finish
+
+        Returns:
+            [list]: Result of each task
+
+        Raises:
+            TimeoutError: The tasks didn't finish in time
+            RuntimeError: A task failed in a worker
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: all(i in self._results for i in task_ids), timeout):
+                raise TimeoutError(f'Tasks not finished after {timeout}s')
+            outcomes = [self._results.pop(task_id) for task_id in task_ids]
+        for error, _ in outcomes:
+            if error is not None:
+                raise RuntimeError(f'Analysis task failed in a worker: {error}')
+        return [result for _, result in outcomes]
+
+    def analyse_move(self, state, action, player, depth, split_depth=SPLIT_DEPTH, leaves_per_task=LEAVES_PER_TASK):
+        """Count the lines of a move, its tree is split between the workers
+
+        The move is analysed here until the split depth, then its leaves are sent in
+        tasks of leaves_per_task leaves.
+
+        Returns:
+            [dict]: Number of lines ending in each points difference
+        """
+        return self._gather_move(*self._submit_move(state, action, player, depth, split_depth, leaves_per_task))
+
+    def analyse_position(self, state, player, depth, split_depth=SPLIT_DEPTH, leaves_per_task=LEAVES_PER_TASK):
+        """Calculate the lottery of every valid action of a position, their trees are split between the workers
+
+        Returns:
+            [dict]: Normalized lottery of each valid action (row, col)
+        """
+        moves = [(action, self._submit_move(state, action, player, depth, split_depth, leaves_per_task))
+                 for action in OthelloGame.get_player_actions_gains(state, player)]
+        return {action: normalize_lottery(self._gather_move(*move)) for action, move in moves}
+
+    def analyse_positions(self, positions, depth):
+        """Calculate the lotteries of a batch of positions, a position per task
+
+        Args:
+            positions ([iterable]): (board, player) of each position, board is a two-channels board
+            depth ([int]): Depth of the analysis
+
+        Returns:
+            [list]: Normalized lottery of each valid action of each position
+        """
+        task_ids = [self.submit({'kind': 'position', 'board': format_board_string(board), 'player': player.value,
+                                 'depth': depth})
+                    for board, player in positions]
+        return [{(row, col): normalize_lottery(dict(pairs)) for row, col, pairs in result}
+                for result in self.gather(task_ids)]
+
+    def close(self):
+        """Stop listening and ask the workers to stop, the tasks not finished are lost"""
+        self._close_event.set()
+        _shutdown_socket(self._server)
+        self._server.close()
+        with self._condition:
+            for worker in self._workers:
+                try:
+                    send_message(worker.sock, {'type': 'shutdown'})
+                except OSError:
+                    pass
+                _shutdown_socket(worker.sock)
+
+    def _submit_move(self, state, action, player, depth, split_depth, leaves_per_task):
+        analysis = MoveAnalysis(state, action, player, depth)
+        split_depth = min(split_depth, depth)
+        analysis.analyse(split_depth)
+        if split_depth == depth:
+            return analysis.get_depth_points(depth), []
+
+        leaves = analysis.get_leaves()
+        if leaves is None:
+            raise ValueError(f'Too many leaves at depth {split_depth}, use a smaller split depth')
+        task = {'kind': 'subtree', 'board': format_board_string(state), 'player': player.value,
+                'action': [int(i) for i in action], 'depth': depth, 'split_depth': split_depth}
+        leaves = [[format_board_string(leaf.board), leaf.player.value, lines] for leaf, lines in leaves]
+        task_ids = [self.submit(dict(task, leaves=leaves[i:i + leaves_per_task]))
+                    for i in range(0, len(leaves), leaves_per_task)]
+        # Lines ended before the split depth are not in any task
+        return analysis.get_terminal_points(split_depth), task_ids
+
+    def _gather_move(self, points, task_ids):
+        for pairs in self.gather(task_ids):
+            _add_points_pairs(points, pairs)
+        return points
+
+    def _accept_workers(self):
+        while True:
+            try:
+                sock, address = self._server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            worker = WorkerConnection(sock, address)
+            with self._condition:
+                if self._close_event.is_set():
+                    sock.close()
+                    return
+                self._workers.add(worker)
+            Thread(target=self._serve_worker, args=(worker,), daemon=True).start()
+
+    def _serve_worker(self, worker):
+        try:
+            while True:
+                message = receive_message(worker.sock)
+                if message is None:
+                    break
+                with self._condition:
+                    worker.last_message = time.monotonic()
+                    if message['type'] == 'hello':
+                        worker.name = message.get('name', worker.name)
+                        worker.is_ready = True
+                        self._dispatch()
+                    elif message['type'] in ('result', 'error'):
+                        self._finish_task(worker, message)
+                        self._dispatch()
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            self._drop_worker(worker)
+
+    def _finish_task(self, worker, message):
+        task_id = message['task']
+        worker.task_ids.discard(task_id)
+        if task_id not in self._tasks:
+            # Another worker already finished the task
+            self.duplicate_results += 1
+            return
+        del self._tasks[task_id]
+        self._results[task_id] = message.get('error'), message.get('result')
+        self._condition.notify_all()
+
+    def _drop_worker(self, worker):
+        with self._condition:
+            self._workers.discard(worker)
+            worker.is_ready = False
+            for task_id in sorted(worker.task_ids, reverse=True):
+                if task_id in self._tasks:
+                    self._pending.appendleft(task_id)
+                    self.requeued_tasks += 1
+            worker.task_ids.clear()
+            self._dispatch()
+        worker.sock.close()
+
+    def _dispatch(self):
+        for worker in self._workers:
+            while worker.is_ready and len(worker.task_ids) < self.tasks_per_worker and self._pending:
+                task_id = self._pending.popleft()
+                if task_id not in self._tasks:
+                    continue
+                worker.task_ids.add(task_id)
+                try:
+                    send_message(worker.sock, dict(self._tasks[task_id], type='task', task=task_id))
+                except OSError:
+                    # Its serving thread drops it and requeues its tasks
+                    worker.is_ready = False
+                    _shutdown_socket(worker.sock)
+
+    def _check_heartbeats(self):
+        while not self._close_event.wait(self.heartbeat_timeout / 4):
+            now = time.monotonic()
+            with self._condition:
+                late_workers = [w for w in self._workers if now - w.last_message > self.heartbeat_timeout]
+                for worker in late_workers:
+                    worker.is_ready = False
+            for worker in late_workers:
+                _shutdown_socket(worker.sock)
+
+
+def run_worker(host, port, name=None, heartbeat_interval=HEARTBEAT_INTERVAL, connect_timeout=30):
+    """Connect to a coordinator and run its tasks until it shuts down or the connection is lost
+
+    Args:
+        host ([str]): Address of the coordinator
+        port ([int]): Port of the coordinator
+        name ([str], optional): Name of the worker in the coordinator, host and process id by default
+        heartbeat_interval ([float]): Seconds between two heartbeats, they're sent while a task runs
+        connect_timeout ([float]): Seconds to retry the connection, the coordinator may start later
+
+    Returns:
+        [int]: Number of tasks run
+    """
+    sock = _connect(host, port, connect_timeout)
+    send_lock = Lock()
+    stopped = Event()
+
+    def send(message):
+        with send_lock:
+            send_message(sock, message)
+
+    def send_heartbeats():
+        while not stopped.wait(heartbeat_interval):
+            try:
+                send({'type': 'heartbeat'})
+            except OSError:
+                return
+
+    count = 0
+    try:
+        send({'type': 'hello', 'name': name or f'{socket.gethostname()}:{os.getpid()}'})
+        Thread(target=send_heartbeats, daemon=True).start()
+        while True:
+            message = receive_message(sock)
+            if message is None or message['type'] == 'shutdown':
+                break
+            try:
+                result = run_task(message)
+            except Exception as e:
+                send({'type': 'error', 'task': message['task'], 'error': repr(e)})
+            else:
+                send({'type': 'result', 'task': message['task'], 'result': result})
+            count += 1
+    except OSError:
+        pass
+    finally:
+        stopped.set()
+        sock.close()
+    return count
+
+
+def _connect(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.5)
+        else:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return sock
+
+
+class LocalCluster:
+    """Coordinator on localhost with worker processes, a stand-in for workers on other hosts"""
+
+    def __init__(self, workers=None, **coordinator_options):
+        """Start the coordinator and the workers
+
+        Args:
+            workers ([int], optional): Number of worker processes, if None use the CPU count
+            coordinator_options: Options of the Coordinator
+        """
+        self.coordinator = Coordinator('127.0.0.1', 0, **coordinator_options)
+        host, port = self.coordinator.address
+        # Spawned, so the workers don't inherit the coordinator threads
+        context = multiprocessing.get_context('spawn')
+        self.processes = [context.Process(target=run_worker, args=(host, port, f'local-{i}'), daemon=True)
+                          for i in range(workers or os.cpu_count())]
+        for process in self.processes:
+            process.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.coordinator.close()
+        for process in self.processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+
+
+def _parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def _analyse_games(coordinator, paths, output, depth, exponential_utility_factor, batch_size=256):
+    from batch_analysis import iter_positions, format_position_result
+
+    count = 0
+    positions = iter_positions(paths)
+    while True:
+        batch = list(itertools.islice(positions, batch_size))
+        if not batch:
+            return count
+        lotteries = coordinator.analyse_positions(((p.board, p.player) for _, _, p in batch), depth)
+        for (source, game_index, position), position_lotteries in zip(batch, lotteries):
+            result = format_position_result(source, game_index, position, position_lotteries,
+                                            exponential_utility_factor)
+            output.write(json.dumps(result) + '\n')
+        count += len(batch)
+
+
+def main():
+    from game_records import format_move
+
+    parser = argparse.ArgumentParser(description='Distribute Othello analyses to workers over TCP')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    worker_parser = subparsers.add_parser('worker', help='Run the tasks of a coordinator')
+    worker_parser.add_argument('address', help='Coordinator HOST:PORT')
+    worker_parser.add_argument('--name', help='Name of the worker, host and process id by default')
+
+    analyse_parser = subparsers.add_parser('analyse', help='Coordinate the analysis of a position or of game files')
+    analyse_parser.add_argument('--depth', type=int, default=4, help='Depth level of the analysis')
+    analyse_parser.add_argument('--board', help='Board squares row by row (X/* black, O white, -/. free)')
+    analyse_parser.add_argument('--player', choices=('black', 'white'), default='black', help='Player to move')
+    analyse_parser.add_argument('--games', nargs='+', help='Analyse every position of WTHOR or move list files')
+    analyse_parser.add_argument('--output', '-o', default='-', help='JSON lines output file of --games, - for stdout')
+    analyse_parser.add_argument('--risk', type=int, default=0, help='Exponential utility factor, from -150 to 150')
+    analyse_parser.add_argument('--bind', default=f'0.0.0.0:{DEFAULT_PORT}', help='Coordinator HOST:PORT')
+    analyse_parser.add_argument('--local-workers', type=int, default=0,
+                                help='Worker processes started on this host, the coordinator listens on localhost')
+    analyse_parser.add_argument('--split-depth', type=int, default=SPLIT_DEPTH, help='Depth where move trees are split')
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        host, port = _parse_address(args.address)
+        count = run_worker(host, port, args.name)
+        print(f'{count} tasks run', file=sys.stderr)
+        return
+
+    if args.local_workers:
+        cluster = LocalCluster(args.local_workers)
+        coordinator = cluster.coordinator
+    else:
+        cluster = None
+        coordinator = Coordinator(*_parse_address(args.bind))
+    print(f'coordinator listening on {coordinator.address[0]}:{coordinator.address[1]}', file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        if args.games:
+            output = sys.stdout if args.output == '-' else open(args.output, 'w')
+            try:
+                count = _analyse_games(coordinator, args.games, output, args.depth, args.risk)
+            finally:
+                if output is not sys.stdout:
+                    output.close()
+            print(f'{count} positions analysed', file=sys.stderr)
+        else:
+            board = parse_board_string(args.board) if args.board else OthelloGame.initial_board(8)
+            player = OthelloPlayer.BLACK if args.player == 'black' else OthelloPlayer.WHITE
+            lotteries = coordinator.analyse_position(board, player, args.depth, args.split_depth)
+            for action, lottery in lotteries.items():
+                print(f'{format_move(action)}: utility {get_lottery_utility(lottery, args.risk):+.4f}')
+    finally:
+        (cluster or coordinator).close()
+    print(f'{time.perf_counter() - start:.2f}s, {coordinator.requeued_tasks} tasks requeued, '
+          f'{coordinator.duplicate_results} duplicate results', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import os
+import argparse
+import numpy as np
+
+from Othello import OthelloGame
+from Othello.bitboard import BOARD_SIZE, pack_boards, get_moves, get_stable_discs, count_bits
+
+
+TABLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'evaluation_tables.npz')
+
+# Pattern squares (row, col) of each instance, all instances of a pattern share its table.
+# Instances start at a corner, so symmetric squares have the same position in the index
+CORNER_REGION = [(row, col) for row in range(3) for col in range(3)]
+PATTERNS = {
+    'edge': [[(0, i) for i in range(8)], [(7, i) for i in range(8)],
+             [(i, 0) for i in range(8)], [(i, 7) for i in range(8)]],
+    'corner': [[(row, col) for row, col in CORNER_REGION], [(row, 7 - col) for row, col in CORNER_REGION],
+               [(7 - row, col) for row, col in CORNER_REGION], [(7 - row, 7 - col) for row, col in CORNER_REGION]],
+    'diagonal': [[(i, i) for i in range(8)], [(i, 7 - i) for i in range(8)]],
+}
+
+# Square values of the classic positional evaluation, used to build the default tables
+SQUARE_WEIGHTS = np.array([
+    [100, -20, 10, 5, 5, 10, -20, 100],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [10, -2, -1, -1, -1, -1, -2, 10],
+    [5, -2, -1, -1, -1, -1, -2, 5],
+    [5, -2, -1, -1, -1, -1, -2, 5],
+    [10, -2, -1, -1, -1, -1, -2, 10],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [100, -20, 10, 5, 5, 10, -20, 100],
+])
+CORNERS = ((0, 0), (0, 7), (7, 0), (7, 7))
+# Pattern points, mobility and stable pieces weights of the default tables, in pieces
+DEFAULT_WEIGHTS = (0.1, 1.0, 1.0)
+# Stable edge pieces bonus of the default tables, in pattern points
+STABLE_EDGE_WEIGHT = 10
+
+
+class PatternEvaluator:
+    """Static evaluation of positions from lookup tables of board patterns
+
+    Each pattern is indexed in base 3 from its squares (0 free, 1 player, 2 opponent),
+    and the points of its table are summed with the mobility and stable pieces
+    differences. The result estimates the final pieces difference of the player.
+    """
+
+    def __init__(self, tables, weights):
+        """Create an evaluator
+
+        Args:
+            tables ([dict]): Points of each configuration of each pattern, by pattern name
+            weights ([tuple]): Weights of the pattern points, the mobility and the stable pieces differences
+        """
+        self.tables = {name: np.asarray(table, dtype=np.float32) for name, table in tables.items()}
+        self.pattern_weight, self.mobility_weight, self.stability_weight = (float(w) for w in weights)
+        self._squares = {name: np.array([[row * BOARD_SIZE + col for row, col in instance] for instance in instances])
+                         for name, instances in PATTERNS.items()}
+        self._powers = {name: 3 ** np.arange(squares.shape[1]) for name, squares in self._squares.items()}
+
+    @classmethod
+    def load(cls, path=TABLES_PATH):
+        """Load the tables of a file saved by save"""
+        with np.load(path) as data:
+            return cls({name: data[name] for name in PATTERNS}, data['weights'])
+
+    def save(self, path=TABLES_PATH):
+        tables = {name: table.astype(np.float16) for name, table in self.tables.items()}
+        weights = np.array([self.pattern_weight, self.mobility_weight, self.stability_weight])
+        np.savez_compressed(path, weights=weights, **tables)
+
+    def evaluate(self, boards, player):
+        """Evaluate a batch of positions
+
+        Args:
+            boards (ndarray(n, 8, 8, 2)): Two-channels boards
+            player ([OthelloPlayer]): Player whose pieces difference is estimated
+
+        Returns:
+            [ndarray(n)]: Estimated final pieces difference, between -64 and 64
+        """
+        boards = np.asarray(boards, dtype=bool)
+        squares = boards.reshape((-1, BOARD_SIZE ** 2, 2))
+        own_channel = OthelloGame.PLAYER_CHANNELS[player]
+        opponent_channel = OthelloGame.PLAYER_CHANNELS[player.opponent]
+        codes = squares[:, :, own_channel] + 2 * squares[:, :, opponent_channel].astype(np.int64)
+
+        pattern_points = np.zeros(len(codes))
+        for name, pattern_squares in self._squares.items():
+            indexes = codes[:, pattern_squares] @ self._powers[name]
+            pattern_points += self.tables[name][indexes].sum(axis=1)
+
+        bitboards = pack_boards(boards)
+        own, opponent = bitboards[player], bitboards[player.opponent]
+        mobility = count_bits(get_moves(own, opponent)) - count_bits(get_moves(opponent, own))
+        stability = count_bits(get_stable_discs(own)) - count_bits(get_stable_discs(opponent))
+
+        values = self.pattern_weight * pattern_points + self.mobility_weight * mobility \
+            + self.stability_weight * stability
+        return np.clip(values, -BOARD_SIZE ** 2, BOARD_SIZE ** 2)
+
+
+def build_default_tables():
+    """Build the tables from the positional square values
+
+    The squares next to a corner are only penalized while the corner is free, and
+    edge pieces connected to an occupied corner get a stability bonus.
+
+    Returns:
+        [PatternEvaluator]: Evaluator with the default tables
+    """
+    # Each square weight is split between the instances covering it
+    coverage = np.zeros((BOARD_SIZE, BOARD_SIZE))
+    for instances in PATTERNS.values():
+        for instance in instances:
+            for row, col in instance:
+                coverage[row, col] += 1
+
+    tables = {}
+    for name, instances in PATTERNS.items():
+        instance = instances[0]
+        size = len(instance)
+        configurations = np.indices((3,) * size).reshape((size, -1)).T[:, ::-1]
+        table = np.zeros(len(configurations))
+        for index, configuration in enumerate(configurations):
+            table[index] = _get_configuration_points(instance, configuration, coverage)
+        tables[name] = table
+    return PatternEvaluator(tables, DEFAULT_WEIGHTS)
+
+
+def _get_configuration_points(instance, configuration, coverage):
+    signs = np.where(configuration == 1, 1, np.where(configuration == 2, -1, 0))
+    occupied = {square: sign for square, sign in zip(instance, signs)}
+    points = 0
+    for square, sign in occupied.items():
+        if not sign:
+            continue
+        weight = SQUARE_WEIGHTS[square]
+        corner = _get_nearest_corner(square)
+        if weight < 0 and max(abs(square[0] - corner[0]), abs(square[1] - corner[1])) == 1 \
+                and occupied.get(corner, 0):
+            weight = 0
+        points += sign * weight / coverage[square]
+
+    # Pieces of the same player running along an edge from an occupied corner can't be flipped
+    if all(row in (0, 7) for row, _ in instance) or all(col in (0, 7) for _, col in instance):
+        for line in (signs, signs[::-1]):
+            if line[0]:
+                run = np.argmax(line != line[0]) if (line != line[0]).any() else len(line)
+                points += line[0] * STABLE_EDGE_WEIGHT * run
+    return points
+
+
+def _get_nearest_corner(square):
+    return min(CORNERS, key=lambda c: abs(c[0] - square[0]) + abs(c[1] - square[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the pattern tables of the static evaluation')
+    parser.add_argument('--output', '-o', default=TABLES_PATH, help='Tables file')
+    args = parser.parse_args()
+
+    evaluator = build_default_tables()
+    evaluator.save(args.output)
+    print(f'{args.output}: {", ".join(f"{n} {len(t)}" for n, t in evaluator.tables.items())} configurations')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import time
+
+from enum import Flag, auto
+from threading import Lock
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class UiUpdate(Flag):
+    NONE = 0
+    # A new analysis of the board is requested, it's applied before the board is drawn
+    ANALYSIS = auto()
+    BOARD = auto()
+    CARDS = auto()
+    PLOT = auto()
+    STATUSBAR = auto()
+
+
+class FrameScheduler(QObject):
+    """Apply the parts of the interface marked dirty at most once per frame, in the GUI thread
+
+    Parts can be marked dirty from any thread. Marking a part many times before the
+    next frame applies it once, and the handlers run in their registration order.
+    """
+    FRAME_INTERVAL = 16  # ms
+
+    _dirty_marked = pyqtSignal()
+
+    def __init__(self, frame_interval=FRAME_INTERVAL, parent=None):
+        super().__init__(parent)
+        self.frame_interval = frame_interval
+        self.frame_count = 0
+        self._handlers = []
+        self._lock = Lock()
+        self._dirty = UiUpdate.NONE
+        self._last_frame = 0
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        # Queued to the scheduler thread when marked from another thread
+        self._dirty_marked.connect(self._schedule_frame)
+
+    def register(self, update, handler):
+        """Call a function in the frames where a part is dirty"""
+        self._handlers.append((update, handler))
+
+    def mark_dirty(self, update):
+        with self._lock:
+            was_clean = not self._dirty
+            self._dirty |= update
+        if was_clean:
+            self._dirty_marked.emit()
+
+    def is_dirty(self, update=None):
+        with self._lock:
+            return bool(self._dirty & update) if update is not None else bool(self._dirty)
+
+    def flush(self):
+        """Apply the dirty parts now"""
+        self._timer.stop()
+        with self._lock:
+            dirty, self._dirty = self._dirty, UiUpdate.NONE
+        if not dirty:
+            return
+        self._last_frame = time.perf_counter()
+        self.frame_count += 1
+        for update, handler in self._handlers:
+            if update & dirty:
+                handler()
+
+    def _schedule_frame(self):
+        if self._timer.isActive() or not self.is_dirty():
+            return
+        elapsed = (time.perf_counter() - self._last_frame) * 1000
+        self._timer.start(max(0, round(self.frame_interval - elapsed)))
@@ -0,0 +1,270 @@
+import time
+import argparse
+import numpy as np
+
+from threading import Event
+from collections import namedtuple
+
+from Othello import OthelloGame, OthelloPlayer, SearchState
+from Othello.bitboard import BOARD_SIZE, pack_boards, unpack_boards, get_moves, split_moves, play_actions, count_bits
+from move_analysis import MoveAnalysis, AnalysisCancelled, normalize_lottery
+from search_statistics import SearchStatistics
+from perft import parse_board_string
+
+
+# Peak bytes of the temporary arrays made for each child while a ply is expanded and merged
+CHILD_BYTES = 320
+
+
+class Frontier(namedtuple('Frontier', ['black', 'white', 'black_to_move', 'lines'])):
+    """Unique positions of a ply: bitboards, player to move and number of lines reaching each"""
+    __slots__ = ()
+
+    @property
+    def size(self):
+        return len(self.lines)
+
+    @property
+    def total_lines(self):
+        return int(self.lines.sum())
+
+
+class FrontierAnalysis:
+    """Analyse a move breadth-first, a whole ply at a time
+
+    Move orders reaching the same position are merged at every ply, so each unique
+    position is expanded once, weighted by its number of lines. The positions of a
+    ply are expanded together on bitboards.
+
+    When the children of a frontier would take more than max_memory bytes, the
+    frontier is split into pieces that fit, and each piece is analysed until the
+    last ply before the next one, depth-first over the pieces. Positions reached
+    from different pieces are not merged. Boards other than 8x8, or a ceiling below
+    the children of a single position, are analysed depth-first by MoveAnalysis.
+
+    The points are the same as MoveAnalysis to the same depth. A stop request is
+    checked between plies.
+    """
+    # Memory ceiling of the children of a frontier, in bytes, the frontier itself comes on top
+    MAX_MEMORY = 256 * 1024 ** 2
+
+    def __init__(self, state, move, current_player, count_future_moves, statistics=None, max_memory=MAX_MEMORY):
+        self.state = np.copy(state)
+        self.move = move
+        self.player = current_player
+        self.count_future_moves = count_future_moves
+        self.points_before = OthelloGame.get_board_players_points(self.state)[self.player]
+        self.statistics = statistics or SearchStatistics()
+        self.max_memory = max_memory
+
+        # Lines and merged positions of each ply before the last, summed over the pieces of the frontiers
+        self.ply_sizes = []
+        # Number of frontiers split to fit in memory
+        self.splits = 0
+
+        self._points = {}
+        self._stop_event = Event()
+        self._depth_first_analysis = None
+
+    def run(self):
+        """Analyse the move, in the calling thread
+
+        Returns:
+            [dict]: Number of lines ending in each points difference, None if it was stopped
+        """
+        self.statistics.start()
+        try:
+            self._points = {}
+            self.ply_sizes, self.splits = [], 0
+            self._analyse()
+        except AnalysisCancelled:
+            return None
+        finally:
+            self.statistics.stop()
+        return self._points
+
+    def stop(self):
+        self._stop_event.set()
+        analysis = self._depth_first_analysis
+        if analysis is not None:
+            analysis.stop()
+
+    def _analyse(self):
+        root = SearchState(self.state, self.player).child(*self.move)
+        self.statistics.add_node(0)
+        points_delta = root.points[self.player] - self.points_before
+        if not root.has_actions():
+            if not root.has_actions(root.player.opponent):
+                self.statistics.terminals += 1
+                self._points[points_delta] = 1
+                return
+            self.statistics.passes += 1
+            root.pass_turn()
+
+        if self.count_future_moves == 0:
+            self._points[points_delta] = 1
+            return
+
+        bitboards = pack_boards(root.board) if root.board.shape[0] == BOARD_SIZE else None
+        if bitboards is None:
+            # Bitboards only fit 8x8 boards, the others are analysed depth-first
+            self._expand_depth_first([(root, 1)], 0)
+            return
+
+        frontier = Frontier(bitboards[OthelloPlayer.BLACK], bitboards[OthelloPlayer.WHITE],
+                            np.array([root.player is OthelloPlayer.BLACK]), np.ones(1, dtype=np.int64))
+        self._add_ply_size(0, frontier)
+        self._expand_plies(frontier, 0)
+
+    def _expand_plies(self, frontier, ply):
+        """Expand a frontier until the last ply, splitting it when its children don't fit in memory"""
+        while frontier.size:
+            if self._stop_event.is_set():
+                raise AnalysisCancelled()
+            own = np.where(frontier.black_to_move, frontier.black, frontier.white)
+            opponent = np.where(frontier.black_to_move, frontier.white, frontier.black)
+            moves = get_moves(own, opponent)
+            children_counts = count_bits(moves)
+            if int(children_counts.sum()) * CHILD_BYTES > self.max_memory:
+                self._split_frontier(frontier, children_counts, ply)
+                return
+            ply += 1
+            frontier = self._expand(frontier, own, opponent, moves, ply)
+            if frontier is None:
+                return
+            self._add_ply_size(ply, frontier)
+
+    def _split_frontier(self, frontier, children_counts, ply):
+        max_children = self.max_memory // CHILD_BYTES
+        if int(children_counts.max()) > max_children:
+            self._expand_depth_first(self._get_frontier_leaves(frontier), ply)
+            return
+        self.splits += 1
+        # Consecutive positions whose children fit together, a piece has fewer children than the frontier
+        pieces = (np.cumsum(children_counts) - 1) // max(max_children, 1)
+        bounds = np.flatnonzero(np.diff(pieces)) + 1
+        for indexes in np.split(np.arange(frontier.size), bounds):
+            self._expand_plies(Frontier(*(array[indexes] for array in frontier)), ply)
+
+    def _expand(self, frontier, own, opponent, moves, ply):
+        """Count the children of every position of a frontier and merge the ones not ending the game
+
+        Returns:
+            [Frontier]: Unique children, None at the last ply
+        """
+        parent_indexes, actions = split_moves(moves)
+        mover, waiting = play_actions(own[parent_indexes], opponent[parent_indexes], actions)
+
+        waiting_can_move = get_moves(waiting, mover) != 0
+        mover_can_move = get_moves(mover, waiting) != 0
+        has_finished = ~waiting_can_move & ~mover_can_move
+        has_passed = ~waiting_can_move & mover_can_move
+
+        black_moved = frontier.black_to_move[parent_indexes]
+        player_is_mover = black_moved == (self.player is OthelloPlayer.BLACK)
+        points_deltas = count_bits(np.where(player_is_mover, mover, waiting)) - self.points_before
+        lines = frontier.lines[parent_indexes]
+
+        self.statistics.add_nodes(ply, len(actions))
+        self.statistics.terminals += int(np.count_nonzero(has_finished))
+        self.statistics.passes += int(np.count_nonzero(has_passed))
+
+        if ply == self.count_future_moves:
+            self.statistics.leaves += len(actions)
+            self._add_histogram(points_deltas, lines)
+            return None
+
+        self.statistics.leaves += int(np.count_nonzero(has_finished))
+        self._add_histogram(points_deltas[has_finished], lines[has_finished])
+
+        children = ~has_finished
+        black_moved, mover, waiting = black_moved[children], mover[children], waiting[children]
+        # The opponent of the mover plays next, unless it passes
+        black_to_move = black_moved == has_passed[children]
+        keys = np.stack([np.where(black_moved, mover, waiting), np.where(black_moved, waiting, mover),
+                         black_to_move.astype(np.uint64)], axis=1)
+        keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        # Exact while the lines are below 2 ** 53
+        merged_lines = np.bincount(inverse.ravel(), weights=lines[children], minlength=len(keys))
+        return Frontier(keys[:, 0], keys[:, 1], keys[:, 2] == 1, np.rint(merged_lines).astype(np.int64))
+
+    def _add_ply_size(self, ply, frontier):
+        while len(self.ply_sizes) <= ply:
+            self.ply_sizes.append((0, 0))
+        lines, positions = self.ply_sizes[ply]
+        self.ply_sizes[ply] = lines + frontier.total_lines, positions + frontier.size
+
+    def _add_histogram(self, points_deltas, lines):
+        squares_count = BOARD_SIZE ** 2
+        histogram = np.bincount(points_deltas + squares_count, weights=lines, minlength=2 * squares_count + 1)
+        for bin_index in np.flatnonzero(histogram):
+            points_delta, bin_lines = int(bin_index) - squares_count, int(round(histogram[bin_index]))
+            self._points[points_delta] = self._points.get(points_delta, 0) + bin_lines
+
+    def _get_frontier_leaves(self, frontier):
+        boards = unpack_boards({OthelloPlayer.BLACK: frontier.black, OthelloPlayer.WHITE: frontier.white})
+        boards = boards.astype(self.state.dtype, copy=False)
+        players = np.where(frontier.black_to_move, OthelloPlayer.BLACK.value, OthelloPlayer.WHITE.value).tolist()
+        return [(SearchState(board, OthelloPlayer(player)), lines)
+                for board, player, lines in zip(boards, players, frontier.lines.tolist())]
+
+    def _expand_depth_first(self, leaves, source_depth):
+        analysis = MoveAnalysis(self.state, self.move, self.player, self.count_future_moves,
+                                statistics=self.statistics)
+        self._depth_first_analysis = analysis
+        if self._stop_event.is_set():
+            raise AnalysisCancelled()
+        for points_delta, lines in analysis.expand_leaves(leaves, source_depth, self.count_future_moves).items():
+            self._points[points_delta] = self._points.get(points_delta, 0) + lines
+
+
+def analyse_position(state, current_player, count_future_moves, statistics=None,
+                     max_memory=FrontierAnalysis.MAX_MEMORY):
+    """Calculate the lottery of every valid action of a position breadth-first, in the calling thread
+
+    Returns:
+        [dict]: Normalized lottery of each valid action (row, col)
+    """
+    lotteries = {}
+    for action in OthelloGame.get_player_actions_gains(state, current_player):
+        analysis = FrontierAnalysis(state, action, current_player, count_future_moves, statistics, max_memory)
+        lotteries[action] = normalize_lottery(analysis.run())
+    return lotteries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the breadth-first frontier analysis with MoveAnalysis')
+    parser.add_argument('--depth', type=int, default=6, help='Depth of the analysis')
+    parser.add_argument('--board', help='Board squares row by row (X/* black, O white, -/. free)')
+    parser.add_argument('--player', choices=('black', 'white'), default='black', help='Player to move')
+    parser.add_argument('--max-memory', type=int, default=FrontierAnalysis.MAX_MEMORY // 1024 ** 2,
+                        help='Memory ceiling of a ply in MB, deeper plies are analysed depth-first')
+    parser.add_argument('--skip-check', action='store_true', help="Don't run MoveAnalysis to compare the results")
+    args = parser.parse_args()
+
+    state = parse_board_string(args.board) if args.board else OthelloGame.initial_board(BOARD_SIZE)
+    player = OthelloPlayer.BLACK if args.player == 'black' else OthelloPlayer.WHITE
+    frontier_time = depth_first_time = 0
+    for action in OthelloGame.get_player_actions_gains(state, player):
+        start = time.perf_counter()
+        analysis = FrontierAnalysis(state, action, player, args.depth, max_memory=args.max_memory * 1024 ** 2)
+        points = analysis.run()
+        frontier_time += time.perf_counter() - start
+        plies = ' '.join(f'{lines}/{positions}' for lines, positions in analysis.ply_sizes)
+        print(f'{action}: lines/positions by ply {plies}, {analysis.splits} frontiers split to fit in memory')
+
+        if not args.skip_check:
+            start = time.perf_counter()
+            depth_first_analysis = MoveAnalysis(state, action, player, args.depth)
+            depth_first_analysis.run()
+            depth_first_time += time.perf_counter() - start
+            if depth_first_analysis.get_result() != points:
+                raise RuntimeError(f'Different points of action {action}')
+
+    print(f'frontier analysis: {frontier_time:.2f}s')
+    if not args.skip_check:
+        print(f'MoveAnalysis: {depth_first_time:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
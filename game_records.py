@@ -0,0 +1,298 @@
+import os
+import re
+import mmap
+import numpy as np
+
+from collections import namedtuple
+
+from Othello import OthelloGame, BoardView
+
+
+WTHOR_HEADER_SIZE = 16
+WTHOR_RECORD_SIZE = 68
+WTHOR_MOVES_OFFSET = 8
+WTHOR_BLACK_SCORE_OFFSET = 6
+WTHOR_MAX_MOVES = 60
+WTHOR_EXTENSIONS = ('.wtb',)
+
+MOVE_PATTERN = re.compile(rb'[a-hA-H][1-8]')
+
+
+class GameRecord(namedtuple('GameRecord', ['source', 'index', 'moves', 'black_score'])):
+    """Game of a database, moves are an uint8 array coded like WTHOR: 10 * (row + 1) + (col + 1)"""
+    __slots__ = ()
+
+    @property
+    def squares(self):
+        """Squares (row, col) played"""
+        return decode_moves(self.moves)
+
+
+Position = namedtuple('Position', ['ply', 'board', 'player', 'move'])
+
+
+class GameDatabase:
+    """Game database file mapped in memory, games are read only when they're accessed
+
+    WTHOR (.wtb) files are indexed from their fixed size records and their moves are
+    views of the mapped file. Move list text files are parsed once into a single
+    array of coded moves, games are views of it.
+    """
+
+    def __init__(self, path):
+        """Open a game database
+
+        Args:
+            path ([str]): Path of a WTHOR (.wtb) file or a text file with a move list per line
+        """
+        self.path = path
+        self._is_wthor = os.path.splitext(path)[1].lower() in WTHOR_EXTENSIONS
+        self._open()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        """Get a game
+
+        Args:
+            index ([int]): Game index
+
+        Returns:
+            [GameRecord]: Game, its moves are a view without copies
+        """
+        if not -len(self) <= index < len(self):
+            raise IndexError('Game index out of range')
+        index %= len(self)
+        offset, length = int(self._offsets[index]), int(self._lengths[index])
+        moves = self._moves_buffer[offset:offset + length]
+        black_score = int(self._black_scores[index]) if self._black_scores is not None else None
+        return GameRecord(self.path, index, moves, black_score)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        # Mapped files can't be pickled, workers map the file again
+        state = {'path': self.path, 'is_wthor': self._is_wthor}
+        if not self._is_wthor:
+            state['index'] = self._moves_buffer, self._offsets, self._lengths
+        return state
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self._is_wthor = state['is_wthor']
+        self._open(state.get('index'))
+
+    def shard(self, shard_index, shard_count):
+        """Get the games of a contiguous part of the database, to split it between workers
+
+        Args:
+            shard_index ([int]): Part index, from 0 to shard_count - 1
+            shard_count ([int]): Number of parts
+
+        Yields:
+            [GameRecord]: Games of the part, in file order
+        """
+        start = len(self) * shard_index // shard_count
+        end = len(self) * (shard_index + 1) // shard_count
+        for index in range(start, end):
+            yield self[index]
+
+    def position(self, index, ply):
+        """Get a game position replaying the game through OthelloGame
+
+        Args:
+            index ([int]): Game index
+            ply ([int]): Number of moves played before the position
+
+        Returns:
+            [Position]: Position, its move is None after the last move
+
+        Raises:
+            ValueError: If a move played before the position is not valid, like replay_game
+        """
+        squares = self[index].squares
+        if not 0 <= ply <= len(squares):
+            raise IndexError('Ply out of range')
+        game = OthelloGame(8)
+        for move_ply, move in enumerate(squares[:ply]):
+            _check_move(game, move_ply, move)
+            game.play(*move)
+        move = squares[ply] if ply < len(squares) else None
+        return Position(ply, np.copy(game.board(view=BoardView.TWO_CHANNELS)), game.current_player, move)
+
+    def positions(self, index):
+        """Get all positions of a game, lazily
+
+        Args:
+            index ([int]): Game index
+
+        Yields:
+            [Position]: Position before each move
+        """
+        yield from replay_game(self[index].squares)
+
+    def close(self):
+        self._moves_buffer = self._offsets = self._lengths = self._black_scores = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Games still referenced keep the file mapped until they're released
+                pass
+            self._mmap = None
+
+    def _open(self, index=None):
+        self._mmap = None
+        self._black_scores = None
+        if index is not None:
+            self._moves_buffer, self._offsets, self._lengths = index
+            return
+
+        with open(self.path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size:
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._is_wthor:
+            self._index_wthor()
+        else:
+            self._index_move_list()
+
+    def _index_wthor(self):
+        size = len(self._mmap) if self._mmap is not None else 0
+        if size < WTHOR_HEADER_SIZE:
+            raise ValueError(f'{self.path} is not a WTHOR file')
+        if self._mmap[12] not in (0, 8):
+            raise ValueError(f'{self.path}: only 8x8 WTHOR games are supported')
+
+        count = (size - WTHOR_HEADER_SIZE) // WTHOR_RECORD_SIZE
+        records = np.frombuffer(self._mmap, dtype=np.uint8, count=count * WTHOR_RECORD_SIZE,
+                                offset=WTHOR_HEADER_SIZE).reshape((count, WTHOR_RECORD_SIZE))
+        self._moves_buffer = np.frombuffer(self._mmap, dtype=np.uint8)
+        self._offsets = WTHOR_HEADER_SIZE + np.arange(count, dtype=np.int64) * WTHOR_RECORD_SIZE + WTHOR_MOVES_OFFSET
+        self._lengths = np.count_nonzero(records[:, WTHOR_MOVES_OFFSET:], axis=1)
+        self._black_scores = records[:, WTHOR_BLACK_SCORE_OFFSET]
+
+    def _index_move_list(self):
+        # The moves of each line are coded straight into growing buffers, the file is
+        # read line by line and never held in lists
+        moves_buffer = np.empty(0, dtype=np.uint8)
+        lengths = np.empty(0, dtype=np.int64)
+        moves_count = games_count = 0
+        if self._mmap is not None:
+            for line in iter(self._mmap.readline, b''):
+                line = line.strip()
+                if not line or line.startswith(b'#'):
+                    continue
+                moves = encode_move_text(b''.join(MOVE_PATTERN.findall(line)))
+                moves_buffer = _reserve(moves_buffer, moves_count + len(moves))
+                moves_buffer[moves_count:moves_count + len(moves)] = moves
+                lengths = _reserve(lengths, games_count + 1)
+                lengths[games_count] = len(moves)
+                moves_count += len(moves)
+                games_count += 1
+            self._mmap.close()
+            self._mmap = None
+
+        self._moves_buffer = moves_buffer[:moves_count].copy()
+        self._lengths = lengths[:games_count].copy()
+        # Empty when there are no games
+        self._offsets = np.cumsum(self._lengths) - self._lengths
+
+
+def format_move(square):
+    """Convert a square to a move in algebraic notation
+
+    Args:
+        square ([tuple]): Square (row, col)
+
+    Returns:
+        [str]: Move like 'f5'
+    """
+    row, col = square
+    return f'{chr(ord("a") + col)}{row + 1}'
+
+
+def encode_move_text(text):
+    """Convert consecutive moves in algebraic notation to WTHOR move bytes
+
+    Args:
+        text ([bytes]): Moves like b'f5d6', column letter and row number
+
+    Returns:
+        [ndarray]: Move bytes, uint8
+    """
+    squares = np.frombuffer(text, dtype=np.uint8).reshape((-1, 2)).astype(np.int64)
+    # Lowercase the column letters, the rows are digits
+    columns = (squares[:, 0] | 0x20) - ord('a')
+    rows = squares[:, 1] - ord('1')
+    return ((rows + 1) * 10 + columns + 1).astype(np.uint8)
+
+
+def decode_moves(moves):
+    """Convert an array of WTHOR move bytes to squares
+
+    Args:
+        moves ([ndarray]): Move bytes, without the trailing zeros
+
+    Returns:
+        [list]: Squares (row, col)
+    """
+    moves = np.asarray(moves, dtype=np.int64)
+    return list(zip((moves // 10 - 1).tolist(), (moves % 10 - 1).tolist()))
+
+
+def read_game_records(path):
+    """Read games from a WTHOR (.wtb) or move list file
+
+    Args:
+        path ([str]): Path of the file
+
+    Yields:
+        [GameRecord]: Games in file order
+    """
+    with GameDatabase(path) as database:
+        yield from database
+
+
+def replay_game(moves, board_size=8):
+    """Replay the moves of a game, passes are inferred by OthelloGame
+
+    Args:
+        moves ([iterable]): Squares (row, col) played
+        board_size ([int]): Size of the board square
+
+    Yields:
+        [Position]: Position before each move, the board is a copy
+
+    Raises:
+        ValueError: If a move is not valid for the player to move
+    """
+    game = OthelloGame(board_size)
+    for ply, move in enumerate(moves):
+        move = tuple(int(i) for i in move)
+        _check_move(game, ply, move)
+        yield Position(ply, np.copy(game.board(view=BoardView.TWO_CHANNELS)), game.current_player, move)
+        game.play(*move)
+
+
+def _check_move(game, ply, move):
+    if game.has_finished() or not game.is_valid_action(*move):
+        raise ValueError(f'Invalid move {format_move(move)} at ply {ply}')
+
+
+def _reserve(array, size):
+    """Get an array holding at least size items, doubling its capacity when it's full"""
+    if size <= len(array):
+        return array
+    grown = np.empty(max(size, 2 * len(array), 1024), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
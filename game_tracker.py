@@ -0,0 +1,155 @@
+import argparse
+import numpy as np
+
+from itertools import permutations
+
+from Othello import OthelloGame, OthelloPlayer, BoardView
+from game_records import Position, read_game_records
+
+
+class GameTracker:
+    """Follow a game from snapshots of its board, inferring the moves played between them
+
+    Each snapshot is compared with the tracked game: the new pieces give the squares
+    played, and the moves are checked with the game rules before they're played on
+    the tracked game, so its board, player to move and history are updated move by
+    move. Passes follow from the rules, as in OthelloGame. A snapshot that no valid
+    moves explain, like a new game, starts the tracking again from it.
+    """
+    # Most moves searched between two snapshots, the snapshots missed by the listener
+    MAX_INFERRED_MOVES = 4
+
+    def __init__(self, board_size=8, max_inferred_moves=MAX_INFERRED_MOVES):
+        self.max_inferred_moves = max_inferred_moves
+        # Number of times the tracking started again from a snapshot
+        self.resyncs = 0
+        self.reset(OthelloGame.initial_board(board_size), OthelloPlayer.BLACK)
+
+    @property
+    def board(self):
+        """Two-channels board of the tracked game, it's updated in place by the next moves"""
+        return self.game.board(view=BoardView.TWO_CHANNELS)
+
+    @property
+    def player(self):
+        """Player to move"""
+        return self.game.current_player
+
+    def reset(self, board, player=None):
+        """Start tracking a game from a position, the history is cleared
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board, it's copied
+            player ([OthelloPlayer], optional): Player to move, if None it's guessed from the board
+        """
+        board = np.copy(board)
+        player = player if player is not None else self._guess_player(board)
+        self.game = OthelloGame(board.shape[0], initial_board=board, current_player=player)
+        self.history = []
+        self._root_key = OthelloGame.pack_board(board).tobytes(), player.value
+
+    def update(self, snapshot):
+        """Apply the moves played until a snapshot of the board
+
+        Args:
+            snapshot (ndarray(board_size, board_size)): One-channel board
+
+        Returns:
+            [list]: Positions before each move played, empty if the board didn't change or
+                the tracking started again from the snapshot
+        """
+        snapshot = np.asarray(snapshot)
+        moves = self._infer_moves(snapshot)
+        if moves is None:
+            self.resyncs += 1
+            self.reset(OthelloGame.convert_to_two_channels_board(snapshot))
+            return []
+
+        positions = []
+        for move in moves:
+            positions.append(Position(len(self.history), np.copy(self.board), self.player, move))
+            self.history.append(positions[-1])
+            self.game.play(*move)
+        return positions
+
+    def get_path_key(self):
+        """Get a key of the game path: the position where the tracking started and the moves since it
+
+        Returns:
+            [tuple]: Hashable key, equal for the same moves from the same position
+        """
+        return self._root_key, tuple(position.move for position in self.history)
+
+    def _infer_moves(self, snapshot):
+        board = self.game.board(view=BoardView.ONE_CHANNEL)
+        if snapshot.shape != board.shape or np.any((board != 0) & (snapshot == 0)):
+            return None
+        squares = list(zip(*(indexes.tolist() for indexes in np.nonzero((board == 0) & (snapshot != 0)))))
+        if not squares:
+            return [] if np.array_equal(board, snapshot) else None
+        if len(squares) == 1:
+            return squares if self._is_single_move(snapshot, squares[0]) else None
+        if len(squares) > self.max_inferred_moves:
+            return None
+        # Orders reaching the same board can't be told apart, the first valid one is taken
+        return next((list(moves) for moves in permutations(squares) if self._is_move_sequence(snapshot, moves)),
+                    None)
+
+    def _is_single_move(self, snapshot, square):
+        # The pieces that changed color must be the flips of the move, checked without playing it
+        board = self.game.board(view=BoardView.ONE_CHANNEL)
+        if self.game.has_finished() or snapshot[square] != self.player.value:
+            return False
+        flips = set(OthelloGame.get_action_flip_squares(self.board, self.player, *square))
+        changed = set(zip(*(indexes.tolist() for indexes in np.nonzero((board != 0) & (board != snapshot)))))
+        return bool(flips) and flips == changed
+
+    def _is_move_sequence(self, snapshot, moves):
+        game = OthelloGame(self.game.board_size, initial_board=np.copy(self.board), current_player=self.player)
+        for move in moves:
+            if game.has_finished() or not game.is_valid_action(*move):
+                return False
+            game.play(*move)
+        return np.array_equal(game.board(view=BoardView.ONE_CHANNEL), snapshot)
+
+    @staticmethod
+    def _guess_player(board):
+        # Without passes black moves when the number of pieces is even
+        players = [p for p in OthelloPlayer if OthelloGame.has_player_actions_on_board(board, p)]
+        if len(players) == 1:
+            return players[0]
+        return OthelloPlayer.BLACK if np.count_nonzero(board) % 2 == 0 else OthelloPlayer.WHITE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Track games from board snapshots, some of them missed, '
+                                                 'and check the inferred moves')
+    parser.add_argument('paths', nargs='+', help='WTHOR or move list files')
+    parser.add_argument('--skip', type=float, default=0.3, help='Probability of missing a snapshot')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the missed snapshots')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    games = moves_count = transposed = resyncs = 0
+    for path in args.paths:
+        for record in read_game_records(path):
+            tracker = GameTracker()
+            game = OthelloGame(8)
+            for move in record.squares:
+                game.play(*move)
+                if rng.random() >= args.skip:
+                    tracker.update(game.board())
+            tracker.update(game.board())
+            if not np.array_equal(tracker.board, game.board(view=BoardView.TWO_CHANNELS)):
+                raise RuntimeError(f'{record.source} game {record.index}: the tracked board differs')
+            inferred = [position.move for position in tracker.history]
+            games += 1
+            moves_count += len(inferred)
+            transposed += not tracker.resyncs and inferred != [tuple(int(i) for i in m) for m in record.squares]
+            resyncs += tracker.resyncs
+    print(f'{games} games, {moves_count} moves inferred, {transposed} games with moves in another order '
+          f'reaching the same boards, {resyncs} resyncs')
+
+
+if __name__ == '__main__':
+    main()
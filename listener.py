@@ -2,11 +2,6 @@ import os
 import re
 import numpy as np
 
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, \
-    UnexpectedAlertPresentException, StaleElementReferenceException, \
-    NoSuchWindowException, WebDriverException
-
 from enum import Enum, auto
 from threading import Thread, Event
 
@@ -14,7 +9,26 @@ from typing import Callable, Dict, List, Tuple
 
 
 _listeners: Dict['OthelloListenerCallback', Callable] = {}
-_listeners_cache: Dict['OthelloListenerCallback', Tuple] = {}
+
+
+# Exceptions module of selenium, it's set once selenium is imported by a listener thread
+_selenium_exceptions = None
+
+
+def _import_selenium():
+    """Import selenium, from the listener thread so it loads while the window is built
+
+    The listeners and their exception handlers only run after it.
+
+    Returns:
+        [module]: selenium.webdriver
+    """
+    global _selenium_exceptions
+    from selenium import webdriver
+    if _selenium_exceptions is None:
+        from selenium.common import exceptions
+        _selenium_exceptions = exceptions
+    return webdriver
 
 
 class ListenerCallback(Enum):
@@ -40,9 +54,9 @@ class ListenerCallbackRegister:
             def wrapper(*args, **kwargs):
                 try:
                     return function(*args, **kwargs)
-                except UnexpectedAlertPresentException:
+                except _selenium_exceptions.UnexpectedAlertPresentException:
                     return None
-                except StaleElementReferenceException:
+                except _selenium_exceptions.StaleElementReferenceException:
                     return None
             return wrapper
         return decorator
@@ -52,7 +66,7 @@ class ListenerCallbackRegister:
         try:
             driver.find_element_by_xpath('//body[not(contains(@class, "not_logged_user"))]')
             return driver.execute_script('return document.getElementById("connected_username").innerText')
-        except NoSuchElementException:
+        except _selenium_exceptions.NoSuchElementException:
             return None
 
     @register_listener(ListenerCallback.IN_ROOM)
@@ -70,7 +84,7 @@ class ListenerCallbackRegister:
         try:
             element = driver.find_element_by_xpath(xpath)
             return element and element.text
-        except NoSuchElementException:
+        except _selenium_exceptions.NoSuchElementException:
             return None
     
     @register_listener(ListenerCallback.PLAYERS)
@@ -79,7 +93,7 @@ class ListenerCallbackRegister:
         try:
             elements = driver.find_elements_by_xpath(xpath)
             return tuple([element.text for element in elements])
-        except NoSuchElementException:
+        except _selenium_exceptions.NoSuchElementException:
             return None
     
     @register_listener(ListenerCallback.BOARD)
@@ -94,7 +108,7 @@ class ListenerCallbackRegister:
                 position = int(position[1]) - 1, int(position[0]) - 1
                 board[position[0], position[1]] = player
             return board
-        except NoSuchElementException:
+        except _selenium_exceptions.NoSuchElementException:
             return None
     
     @register_listener(ListenerCallback.PLAYERS_POINTS)
@@ -105,7 +119,7 @@ class ListenerCallbackRegister:
             points = driver.execute_script('return Array.prototype.map.call(document.querySelectorAll(".player_score_value"),(item) => item.innerText)')
             points = map(int, points)
             return dict(zip(players, points))
-        except NoSuchElementException:
+        except _selenium_exceptions.NoSuchElementException:
             return None
 
     @register_listener(ListenerCallback.PLAYERS_TIME)
@@ -115,7 +129,7 @@ class ListenerCallbackRegister:
             players = [p.text for p in players]
             times = driver.execute_script('return Array.prototype.map.call(document.querySelectorAll(".timeToThink"),(item) => item.innerText)')
             return dict(zip(players, times))
-        except NoSuchElementException:
+        except _selenium_exceptions.NoSuchElementException:
             return None
     
     @register_listener(ListenerCallback.PLAYER_COLOR)
@@ -124,7 +138,7 @@ class ListenerCallbackRegister:
             xpath = '//*[contains(@class, "player-name")]//a'
             logged_player_style = driver.find_element_by_xpath(xpath).get_attribute('style')
             return 1 if logged_player_style == 'color: rgb(0, 0, 0);' else -1
-        except NoSuchElementException:
+        except _selenium_exceptions.NoSuchElementException:
             return None
 
     @register_listener(ListenerCallback.IS_FINISHED)
@@ -132,7 +146,7 @@ class ListenerCallbackRegister:
         try:
             driver.find_element_by_id('createNew_btn')
             return True
-        except NoSuchElementException:
+        except _selenium_exceptions.NoSuchElementException:
             return None
 
     @register_listener(ListenerCallback.GAME_PROGRESS)
@@ -140,20 +154,30 @@ class ListenerCallbackRegister:
         try:
             element = driver.find_element_by_id('pr_gameprogression')
             return element and element.text
-        except NoSuchElementException:
+        except _selenium_exceptions.NoSuchElementException:
             return None
 
 
 class OthelloListener(Thread):
     HOME_PAGE = 'https://en.boardgamearena.com/account'
+    TABLE_PAGE = 'https://en.boardgamearena.com/reversi?table={}'
     
-    def __init__(self):
+    def __init__(self, start_page=HOME_PAGE):
+        """Create a listener of a Chrome window
+
+        Args:
+            start_page ([str]): Page opened by the window, a table page to observe a game
+        """
+        self.start_page = start_page
         self._driver = None
         self._stop_event = Event()
         self._callbacks: Dict[OthelloListenerCallback, List[Callable]] = {}
+        # Last result of each listener of this window, the callbacks only run when it changes
+        self._cache: Dict[OthelloListenerCallback, Tuple] = {}
         super().__init__(daemon=True)
 
     def run(self):
+        webdriver = _import_selenium()
         options = webdriver.ChromeOptions()
         options.add_argument('--lang=en')
         if os.name == 'nt':
@@ -161,7 +185,7 @@ class OthelloListener(Thread):
         else:
             executable_path = './chromedriver'
         self._driver = webdriver.Chrome(executable_path=executable_path, options=options)
-        self._driver.get(OthelloListener.HOME_PAGE)
+        self._driver.get(self.start_page)
 
         self._listener()
 
@@ -173,11 +197,14 @@ class OthelloListener(Thread):
         self._callbacks[type_].append(callback)
     
     def unregister_callback(self, callback: Callable):
-        self._callbacks[type_].remove(callback)
+        for callbacks in self._callbacks.values():
+            if callback in callbacks:
+                callbacks.remove(callback)
 
-    def _listener(self):
-        global _listeners_cache
+    def stop(self):
+        self._stop_event.set()
 
+    def _listener(self):
         while not self._stop_event.is_set():
             for type_ in ListenerCallback:
                 if type_ in self._callbacks and type_ in _listeners:
@@ -185,13 +212,13 @@ class OthelloListener(Thread):
                     self._driver.implicitly_wait(0)
                     try:
                         result = listener(self._driver)
-                    except NoSuchWindowException:
+                    except _selenium_exceptions.NoSuchWindowException:
                         self._stop_event.set()
                         break
-                    except WebDriverException:
+                    except _selenium_exceptions.WebDriverException:
                         self._stop_event.set()
                         break
-                    cache_result = _listeners_cache.get(type_)
+                    cache_result = self._cache.get(type_)
                     cache_result = cache_result and cache_result[1]
                     if isinstance(result, np.ndarray):
                         results_are_equals = np.all(result == cache_result)
@@ -200,7 +227,7 @@ class OthelloListener(Thread):
                     callback_params = tuple([type_] + [result])
                     if result is not None and not results_are_equals:
                         self._run_callbacks(type_, callback_params)
-                    _listeners_cache[type_] = callback_params
+                    self._cache[type_] = callback_params
 
         if ListenerCallback.CLOSE in self._callbacks:
             self._run_callbacks(ListenerCallback.CLOSE, (ListenerCallback.CLOSE, None))
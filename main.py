@@ -1,35 +1,43 @@
-import os
-import sys
 import time
-import matplotlib
-import numpy as np
-import collections
 
-matplotlib.use('Qt5Agg')
+# Start of the imports, the first startup phase. The timestamp is taken before the other
+# imports on purpose, so they are counted
+STARTUP_START = time.perf_counter()
 
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+import os  # noqa: E402
+import sys  # noqa: E402
+import logging  # noqa: E402
+import numpy as np  # noqa: E402
+import collections  # noqa: E402
 
-from PyQt5.QtGui import QFont
-from PyQt5.QtWidgets import *
-from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtGui import QFont  # noqa: E402
+from PyQt5.QtWidgets import *  # noqa: E402
+from PyQt5.QtCore import QTimer, Qt, pyqtSignal  # noqa: E402
 
-from threading import Thread
+from Widgets import BoardWidget, BoardRenderMode, PlayerCardWidget, LegendWidget, \
+    FloatingDialogWidget, FloatingDialogAlignment  # noqa: E402
 
-from Widgets import BoardWidget, PlayerCardWidget, LegendWidget, \
-    FloatingDialogWidget, FloatingDialogAlignment
+from Othello import OthelloGame, OthelloPlayer  # noqa: E402
 
-from Othello import OthelloGame, OthelloPlayer
+from listener import OthelloListener, ListenerCallback  # noqa: E402
+from move_analysis import get_best_action, get_lottery_utility, get_utility_value  # noqa: E402
+from analysis_service import AnalysisService  # noqa: E402
+from frame_scheduler import FrameScheduler, UiUpdate  # noqa: E402
+from game_tracker import GameTracker  # noqa: E402
+from search import SearchMode, SearchResult  # noqa: E402
 
-from listener import OthelloListener, ListenerCallback
-from move_analysis import MoveAnalysis
 
-class MplCanvas(FigureCanvas):
+def create_plot_canvas(width=5, height=4, dpi=100):
+    """Create a matplotlib canvas with a single plot, matplotlib is imported on the first call"""
+    import matplotlib
+    matplotlib.use('Qt5Agg')
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+    from matplotlib.figure import Figure
 
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)        
-        self.axes = fig.add_subplot(111)
-        super(MplCanvas, self).__init__(fig)
+    figure = Figure(figsize=(width, height), dpi=dpi)
+    canvas = FigureCanvasQTAgg(figure)
+    canvas.axes = figure.add_subplot(111)
+    return canvas
 
 
 class Application(QApplication):
@@ -39,29 +47,82 @@ class Application(QApplication):
 
     WINDOW_SIZE = 850, 600 #490
 
+    STATUSBAR_UPDATE_INTERVAL = 250  # ms
+
+    # Wait for the other events of the new round before rendering it
+    ROUND_RENDER_DELAY = 200  # ms
+
+    LOTTERIES_MAX_DEPTH_LEVEL = 10
+    SEARCH_MAX_DEPTH_LEVEL = 20
+
+    # Decision methods, the lotteries don't use a search mode
+    DECISION_METHODS = (('Lotteries', None), ('Alpha-beta', SearchMode.ALPHA_BETA),
+                        ('Expectimax', SearchMode.EXPECTIMAX))
+
+    # Path of a file to write search statistics as JSON lines
+    STATISTICS_LOG_ENV = 'OTHELLO_STATISTICS_LOG'
+    # Set to print the duration of each startup phase on stderr
+    STARTUP_TIMING_ENV = 'OTHELLO_STARTUP_TIMING'
+
+    # Listener events are emitted from the listener threads and handled on the GUI thread
+    listener_event = pyqtSignal(object, object)
+
     def __init__(self, window_title):
+        self._startup_phases = [('imports', time.perf_counter())]
         super().__init__(sys.argv)
+        self._mark_startup_phase('qt')
 
         # Listeners
         self._listener = OthelloListener()
-
-        self._listener.register_callback(ListenerCallback.BOARD, self._listener_callback)
-        self._listener.register_callback(ListenerCallback.PLAYERS, self._listener_callback)
-        self._listener.register_callback(ListenerCallback.PLAYERS_TIME, self._listener_callback)
-        self._listener.register_callback(ListenerCallback.PLAYERS_POINTS, self._listener_callback)
-        self._listener.register_callback(ListenerCallback.PLAYER_COLOR, self._listener_callback)
-        self._listener.register_callback(ListenerCallback.CURRENT_PLAYER, self._listener_callback)
-        self._listener.register_callback(ListenerCallback.GAME_PROGRESS, self._listener_callback)
+        self.listener_event.connect(self._listener_callback)
+
+        self._listener.register_callback(ListenerCallback.BOARD, self.listener_event.emit)
+        self._listener.register_callback(ListenerCallback.PLAYERS, self.listener_event.emit)
+        self._listener.register_callback(ListenerCallback.PLAYERS_TIME, self.listener_event.emit)
+        self._listener.register_callback(ListenerCallback.PLAYERS_POINTS, self.listener_event.emit)
+        self._listener.register_callback(ListenerCallback.PLAYER_COLOR, self.listener_event.emit)
+        self._listener.register_callback(ListenerCallback.CURRENT_PLAYER, self.listener_event.emit)
+        self._listener.register_callback(ListenerCallback.GAME_PROGRESS, self.listener_event.emit)
         if os.name != 'nt':
-            self._listener.register_callback(ListenerCallback.IN_GAME, self._listener_callback)
+            self._listener.register_callback(ListenerCallback.IN_GAME, self.listener_event.emit)
 
-        self._listener.register_callback(ListenerCallback.CLOSE, self._listener_close_callback)
+        self._listener.register_callback(ListenerCallback.CLOSE, self.listener_event.emit)
 
-        self._move_analysis = None
+        # Chrome starts while the windows are built, its events wait for the event loop
+        self._listener.start()
+        self._mark_startup_phase('listener')
+
+        statistics_log_path = os.environ.get(self.STATISTICS_LOG_ENV)
+        self._log_statistics = bool(statistics_log_path)
+        if self._log_statistics:
+            logging.basicConfig(filename=statistics_log_path, level=logging.INFO, format='%(message)s')
+
+        self._analysis_service = AnalysisService(log_statistics=self._log_statistics)
+        self._analysis_service.finished.connect(self._analysis_finished)
+        self._analysis_service.progress.connect(self._analysis_finished)
+        self._analysis_request = None
+        self.aboutToQuit.connect(lambda: self._analysis_service.shutdown(wait=False))
+        self._mark_startup_phase('analysis service')
+
+        # The interface parts are marked dirty by the events and applied once per frame
+        self._scheduler = FrameScheduler(parent=self)
+        self._scheduler.register(UiUpdate.ANALYSIS, self._request_analysis)
+        self._scheduler.register(UiUpdate.BOARD, self._draw_board)
+        self._scheduler.register(UiUpdate.CARDS, self._update_cards)
+        self._scheduler.register(UiUpdate.PLOT, self._draw_plot)
+        self._scheduler.register(UiUpdate.STATUSBAR, self._update_statusbar)
+
+        self._round_render_timer = QTimer()
+        self._round_render_timer.setSingleShot(True)
+        self._round_render_timer.timeout.connect(self._render_board)
 
         self._player_name = None
         self._opponent_name = None
         self._lotteries = {}
+        self._search_result = None
+        self._search_mode = None
+        self._pattern_evaluation = False
+        self._hover_contents = {}
 
         self._current_player = None
         self._player_color = None
@@ -69,6 +130,10 @@ class Application(QApplication):
         self._players_points = dict()
         self._rendered_rounds = set()
         self._board = None
+        # Game followed from the board snapshots, its two-channels board is updated move by move
+        self._tracker = GameTracker()
+        # The board is drawn with the actions highlighted until it changes
+        self._board_highlighted = False
         self._game_progress = None
         self._depth_level = 2
         self._exponential_utility_factor = 0
@@ -91,7 +156,7 @@ class Application(QApplication):
         self._main_window.setFixedWidth(self.WINDOW_SIZE[0])
         self._main_window.setFixedHeight(self.WINDOW_SIZE[1])
 
-        self._board_widget = BoardWidget(8)
+        self._board_widget = BoardWidget(8, render_mode=BoardRenderMode.PAINTER)
         self._board_widget.register_square_hover_callback(self._square_hover)
         self._floating_dialog_widget = FloatingDialogWidget(parent=self._board_widget)
         self._floating_dialog_widget.hide()
@@ -121,7 +186,7 @@ class Application(QApplication):
         depth_level_title = QLabel('Depth level')
         self._depth_level_slider_label = QLabel('0')
         self._depth_level_slider = QSlider(Qt.Horizontal)
-        self._depth_level_slider.setRange(0, 10)
+        self._depth_level_slider.setRange(0, self.LOTTERIES_MAX_DEPTH_LEVEL)
         self._depth_level_slider.setTickInterval(1)
         self._depth_level_slider.valueChanged.connect(self._depth_level_slider_changed)
         self._depth_level_slider.setValue(self._depth_level)
@@ -129,6 +194,19 @@ class Application(QApplication):
         self._parameters_layout.addWidget(self._depth_level_slider)
         self._parameters_layout.addWidget(self._depth_level_slider_label, alignment=Qt.AlignCenter)
 
+        # Decision Method
+        decision_method_title = QLabel('Decision method')
+        self._decision_method_combo_box = QComboBox()
+        for name, search_mode in self.DECISION_METHODS:
+            self._decision_method_combo_box.addItem(name, search_mode)
+        self._decision_method_combo_box.currentIndexChanged.connect(self._decision_method_changed)
+        self._pattern_evaluation_check_box = QCheckBox('Pattern evaluation')
+        self._pattern_evaluation_check_box.setEnabled(False)
+        self._pattern_evaluation_check_box.stateChanged.connect(self._pattern_evaluation_changed)
+        self._parameters_layout.addWidget(decision_method_title)
+        self._parameters_layout.addWidget(self._decision_method_combo_box)
+        self._parameters_layout.addWidget(self._pattern_evaluation_check_box)
+
         # Value Function
         value_function_title = QLabel('Value Function')
         self._parameters_layout.addWidget(value_function_title)
@@ -139,11 +217,13 @@ class Application(QApplication):
 
         vbox = QVBoxLayout()
         group_box.setLayout(vbox)
-        self._canvas = MplCanvas(self, width=5, height=6, dpi=100)
+        # The plot is created once the first window is shown, matplotlib is slow to import
+        self._plot_layout = vbox
+        self._canvas = None
+        self._plot_line = None
+        self._plot_background = None
         self._xdata = np.array(range(-20, 20, 1))
         self._ydata = self._get_utility_value(self._xdata)
-        vbox.addWidget(self._canvas)
-        self._update_plot()
 
         #slide exponential utility factor
         factor_level_title = QLabel('Risk Level: ')
@@ -176,13 +256,42 @@ class Application(QApplication):
         self._statusbar = QStatusBar()
         self._main_layout.addWidget(self._statusbar, 2, 0, 1, 2)
 
+        self._statusbar_timer = QTimer()
+        self._statusbar_timer.timeout.connect(lambda: self._scheduler.mark_dirty(UiUpdate.STATUSBAR))
+        self._statusbar_timer.start(self.STATUSBAR_UPDATE_INTERVAL)
+        self._mark_startup_phase('windows')
+
     def run(self):
-        self._listener.start()
         if os.name == 'nt':
             self._main_window.show()
         else:
             self._waiting_window.show()
+        QTimer.singleShot(0, self._create_plot)
         sys.exit(self.exec_())
+
+    def _create_plot(self):
+        self._mark_startup_phase('first window')
+        self._canvas = create_plot_canvas(width=5, height=6, dpi=100)
+        # The line is drawn over a copy of the axes, so a new risk level doesn't redraw the figure
+        self._plot_line, = self._canvas.axes.plot(self._xdata, self._ydata, 'r', animated=True)
+        self._canvas.mpl_connect('draw_event', self._plot_drawn)
+        self._plot_layout.insertWidget(0, self._canvas)
+        self._draw_plot()
+        self._mark_startup_phase('plot')
+        self._report_startup()
+
+    def _mark_startup_phase(self, name):
+        self._startup_phases.append((name, time.perf_counter()))
+
+    def _report_startup(self):
+        if not os.environ.get(self.STARTUP_TIMING_ENV):
+            return
+        phases = []
+        start = STARTUP_START
+        for name, end in self._startup_phases:
+            phases.append(f'{name} {end - start:.3f}s')
+            start = end
+        print(f'startup: {", ".join(phases)}, total {start - STARTUP_START:.3f}s', file=sys.stderr)
     
     def _in_game_callback(self, event, result):
         if result:
@@ -191,17 +300,20 @@ class Application(QApplication):
         else:
             self._player_name = None
             self._opponent_name = None
-            self._lotteries = {}
+            self._set_lotteries({})
 
             self._current_player = None
             self._player_color = None
             self._players_time = dict()
             self._players_points = dict()
             self._board = None
+            self._tracker = GameTracker()
             self._depth_level = 2
             self._game_progress = None
             self._rendered_rounds = set()
             self._exponential_utility_factor = 0
+            self._analysis_service.cancel()
+            self._analysis_request = None
 
             self._waiting_window.show()
             self._main_window.hide()
@@ -223,31 +335,36 @@ class Application(QApplication):
             self._in_game_callback(event, result)
         elif event is ListenerCallback.GAME_PROGRESS:
             self._game_progress_callback(event, result)
-
-        
-        if self._player_name:
-            self._player_card_widget.set_player_name(self._player_name)
-            self._opponent_card_widget.set_player_name(self._opponent_name)
-
-            if self._players_time:
-                self._player_card_widget.set_time(self._players_time[self._player_name])
-                self._opponent_card_widget.set_time(self._players_time[self._opponent_name])
-            
-            if self._players_points:
-                self._player_card_widget.set_points(self._players_points[self._player_name])
-                self._opponent_card_widget.set_points(self._players_points[self._opponent_name])
-
-            if self._game_progress and self._game_progress not in self._rendered_rounds:
-                self._lotteries = {}  # Clear lotteries when the round changes
-                if self._move_analysis and self._move_analysis.is_alive():
-                    self._move_analysis.stop()
-                    self._move_analysis.join()
-                time.sleep(0.2)
-                self._render_board()
+        elif event is ListenerCallback.CLOSE:
+            self._listener_close_callback(event, result)
+
+        self._scheduler.mark_dirty(UiUpdate.CARDS)
+        if self._player_name and self._game_progress and self._game_progress not in self._rendered_rounds:
+            if self._lotteries or self._analysis_request:
+                self._set_lotteries({})  # Clear lotteries when the round changes
+                self._analysis_service.cancel()
+                self._analysis_request = None
+            self._round_render_timer.start(self.ROUND_RENDER_DELAY)
+
+    def _update_cards(self):
+        if not self._player_name:
+            return
+        self._player_card_widget.set_player_name(self._player_name)
+        self._opponent_card_widget.set_player_name(self._opponent_name)
+
+        if self._players_time:
+            self._player_card_widget.set_time(self._players_time[self._player_name])
+            self._opponent_card_widget.set_time(self._players_time[self._opponent_name])
+
+        if self._players_points:
+            self._player_card_widget.set_points(self._players_points[self._player_name])
+            self._opponent_card_widget.set_points(self._players_points[self._opponent_name])
 
     def _board_callback(self, event, result):
         self._board = result
-        self._board_widget.set_board(result)
+        self._tracker.update(result)
+        self._board_highlighted = False
+        self._scheduler.mark_dirty(UiUpdate.BOARD)
     
     def _game_progress_callback(self, event, result):
         if result:
@@ -277,23 +394,46 @@ class Application(QApplication):
         self.quit()
 
     def _square_hover(self, square):
-        if not (square and square in self._lotteries):
+        if not (square and square in self._hover_contents):
             return self._floating_dialog_widget.hide()
-        
-        board_size = self._board_widget.get_board_size()
-        board_width, board_height = self._board_widget.get_size()
-        square_size = board_width // board_size
-        x = square[1] * square_size + square_size // 2
-        y = square[0] * square_size + square_size // 2
-        
-        ordered_lottery = collections.OrderedDict(sorted(self._lotteries[square].items()))
+
+        text, size, alignment, position = self._hover_contents[square]
+        self._floating_dialog_widget.set_text(text, size)
+        self._floating_dialog_widget.set_alignment(alignment)
+        self._floating_dialog_widget.move(*position)
+        self._floating_dialog_widget.show()
+
+    def _set_lotteries(self, lotteries):
+        hover_contents = {}
+        for square, lottery in lotteries.items():
+            hover_contents[square] = self._get_hover_content(square, self._get_lottery_text(lottery))
+        self._lotteries = lotteries
+        self._search_result = None
+        self._hover_contents = hover_contents
+
+    def _set_search_result(self, search_result):
+        text = f'Value {search_result.value:+.3f}\nDepth {search_result.depth}'
+        self._lotteries = {}
+        self._search_result = search_result
+        self._hover_contents = {search_result.action: self._get_hover_content(search_result.action, text)}
+
+    def _get_lottery_text(self, lottery):
+        ordered_lottery = collections.OrderedDict(sorted(lottery.items()))
         
         lines = []
         for pieces, probability in ordered_lottery.items():
             pieces = f'{pieces:+}'.ljust(5)
             probability = ('{:.2f}%'.format(probability * 100)).rjust(8)
             lines.append(f'{pieces}-{probability}')
-        self._floating_dialog_widget.set_text('\n'.join(lines))
+        return '\n'.join(lines)
+
+    def _get_hover_content(self, square, text):
+        board_size = self._board_widget.get_board_size()
+        board_width, board_height = self._board_widget.get_size()
+        square_size = board_width // board_size
+        x = square[1] * square_size + square_size // 2
+        y = square[0] * square_size + square_size // 2
+        size = self._floating_dialog_widget.measure_text(text)
         
         if square[1] < board_size // 2 and square[0] < board_size // 2:
             alignment = FloatingDialogAlignment.TOP_LEFT
@@ -304,88 +444,122 @@ class Application(QApplication):
         elif square[1] < board_size // 2 and square[0] >= board_size // 2:
             alignment = FloatingDialogAlignment.BOTTOM_LEFT
 
-        self._floating_dialog_widget.set_alignment(alignment)
-        self._floating_dialog_widget.move(x, y)
-        self._floating_dialog_widget.show()
+        return text, size, alignment, (x, y)
 
     def _render_board(self, update_lotteries=True):
+        """Draw the board with its actions on the next frame, analysing it again if update_lotteries"""
+        self._board_highlighted = True
+        self._scheduler.mark_dirty(UiUpdate.BOARD | UiUpdate.ANALYSIS if update_lotteries else UiUpdate.BOARD)
+
+    def _is_player_turn(self):
+        return self._board is not None and self._current_player == self._player_name and self._player_color \
+            and self._game_progress
+
+    def _request_analysis(self):
+        if not self._is_player_turn():
+            return
+        self._rendered_rounds.add(self._game_progress)
+        self._set_lotteries({})
+        # The game path identifies the position, unless the tracker guessed another player to move
+        position_key = self._tracker.get_path_key() if self._tracker.player is self._player_color else None
+        self._analysis_request = self._analysis_service.request(self._tracker.board, self._player_color,
+                                                                self._depth_level, self._search_mode,
+                                                                self._exponential_utility_factor,
+                                                                self._pattern_evaluation, position_key)
+
+    def _draw_board(self):
+        if self._board is None:
+            return
         highlight_squares = dict()
-        if self._board is not None and self._current_player == self._player_name and self._player_color and self._game_progress:
+        if self._board_highlighted and self._is_player_turn():
             self._rendered_rounds.add(self._game_progress)
-            state = OthelloGame.convert_to_two_channels_board(self._board)
-            greedy_actions = tuple(OthelloGame.get_greedy_actions(state, self._player_color))
-            valid_actions = OthelloGame.get_player_valid_actions(state, self._player_color)
-            highlight_squares.update({tuple(a): self.VALID_ACTIONS_COLOR for a in valid_actions})
-            highlight_squares.update({tuple(a): self.GREEDY_ACTION_COLOR for a in greedy_actions})
-            self._board_widget.set_board(self._board, highlight_squares=highlight_squares)
-            
-            success = not update_lotteries or self._update_lotteries()
-            if success:
-                best_action = self._get_best_action()
-                highlight_squares.update({best_action: self.BEST_ACTION_COLOR})
-                self._board_widget.set_board(self._board, highlight_squares=highlight_squares)
-        elif self._board is not None:
-            self._board_widget.set_board(self._board, highlight_squares=highlight_squares)
+            greedy_actions, gains = OthelloGame.get_greedy_actions_and_gains(self._tracker.board, self._player_color)
+            highlight_squares.update({a: self.VALID_ACTIONS_COLOR for a in gains})
+            highlight_squares.update({a: self.GREEDY_ACTION_COLOR for a in greedy_actions})
+            if self._lotteries or self._search_result:
+                highlight_squares.update({self._get_best_action(): self.BEST_ACTION_COLOR})
+        self._board_widget.set_board(self._board, highlight_squares=highlight_squares)
+
+    def _analysis_finished(self, request_id, result):
+        if self._analysis_request is None or request_id != self._analysis_request.id:
+            return  # Superseded by a newer request
+        if isinstance(result, SearchResult):
+            self._set_search_result(result)
+        else:
+            self._set_lotteries(result)
+        self._render_board(update_lotteries=False)
+        self._scheduler.mark_dirty(UiUpdate.STATUSBAR)
+
+    def _decision_method_changed(self, index):
+        self._search_mode = self._decision_method_combo_box.itemData(index)
+        max_depth_level = self.LOTTERIES_MAX_DEPTH_LEVEL if self._search_mode is None else self.SEARCH_MAX_DEPTH_LEVEL
+        self._depth_level_slider.setMaximum(max_depth_level)
+        # The lotteries are distributions of the real points, they're never evaluated
+        self._pattern_evaluation_check_box.setEnabled(self._search_mode is not None)
+        self._render_board()
+
+    def _pattern_evaluation_changed(self, state):
+        self._pattern_evaluation = state == Qt.Checked
+        self._render_board()
 
     def _depth_level_slider_changed(self, value):
         self._depth_level_slider_label.setText(str(value))
         self._depth_level = value
-        Thread(target=self._render_board).start()
+        self._render_board()
     
     def _factor_changed(self, value):
         self._factor_level_slider_label.setText(str(value/10 if value != 0 else 0))
         self._exponential_utility_factor = value
         self._update_plot()
-        self._render_board(False)
+        # The risk changes the expectimax values, the other methods only weigh their results again
+        self._render_board(self._search_mode is SearchMode.EXPECTIMAX)
     
     def _update_plot(self):
         self._ydata = self._get_utility_value(self._xdata)
-        self._canvas.axes.cla()
-        self._canvas.axes.plot(self._xdata, self._ydata, 'r')
-        self._canvas.draw()
-
-    def _update_lotteries(self):
-        if self._move_analysis and self._move_analysis.is_alive():
-            self._move_analysis.stop()
-            self._move_analysis.join()
-        
-        state = OthelloGame.convert_to_two_channels_board(self._board)
-        possible_actions = list(OthelloGame.get_player_valid_actions(state, self._player_color))
-
-        lotteries = {}
-        success = False
-        for action in possible_actions:
-            self._statusbar.showMessage('Calculating best action...')
-            action = tuple(action)
-            self._move_analysis = MoveAnalysis(state, action, self._player_color, self._depth_level)
-            self._move_analysis.start()
-            lottery = self._move_analysis.get_result()
-            if not lottery:
-                break
-            lotteries.update({action: lottery})
+        self._scheduler.mark_dirty(UiUpdate.PLOT)
+
+    def _draw_plot(self):
+        if self._canvas is None:
+            return
+        self._plot_line.set_ydata(self._ydata)
+        axes = self._canvas.axes
+        low, high = self._ydata.min(), self._ydata.max()
+        bottom, top = axes.get_ylim()
+        if self._plot_background is None or low < bottom or high > top or high - low < (top - bottom) / 4:
+            # The limits get a margin, so the next risk levels usually fit in them
+            margin = (high - low) / 4
+            axes.set_ylim(low - margin, high + margin)
+            self._canvas.draw()
         else:
-            sums = {a: sum(lotteries[a].values()) for a in lotteries}
-            for a in lotteries:
-                lotteries[a] = {p: lotteries[a][p] / sums[a] for p in lotteries[a]}
-            self._lotteries = lotteries
-            success = True
-        
-        self._statusbar.showMessage('')
-
-        return success
+            self._canvas.restore_region(self._plot_background)
+            axes.draw_artist(self._plot_line)
+            self._canvas.blit(axes.bbox)
+
+    def _plot_drawn(self, event):
+        self._plot_background = self._canvas.copy_from_bbox(self._canvas.figure.bbox)
+        self._canvas.axes.draw_artist(self._plot_line)
+
+    def _update_statusbar(self):
+        if self._analysis_request is None:
+            return self._statusbar.clearMessage()
+        statistics = self._analysis_request.statistics
+        if self._analysis_request.token.is_cancelled():
+            self._statusbar.showMessage(f'Analysis cancelled: {statistics}')
+        elif statistics.is_running():
+            self._statusbar.showMessage(f'Calculating best action... {statistics}')
+        else:
+            self._statusbar.showMessage(f'Best action calculated: {statistics}')
 
     def _get_best_action(self):
-        return max(self._lotteries, key=lambda a: self._get_lottery_utility(self._lotteries[a]))
+        if self._search_result is not None:
+            return self._search_result.action
+        return get_best_action(self._lotteries, self._exponential_utility_factor)
     
     def _get_lottery_utility(self, lottery):
-        return sum(self._get_utility_value(value) * probability for value, probability in lottery.items())
+        return get_lottery_utility(lottery, self._exponential_utility_factor)
     
     def _get_utility_value(self, value):
-        value = value/63
-        if self._exponential_utility_factor == 0:
-            return value
-        else:
-            return (1-np.exp(-(-self._exponential_utility_factor/10) * value))/ (-self._exponential_utility_factor/10)
+        return get_utility_value(value, self._exponential_utility_factor)
 
 
 if __name__ == '__main__':
@@ -1,12 +1,33 @@
 import numpy as np
 
-from Othello import OthelloGame, OthelloPlayer, BoardView
+from Othello import OthelloGame, OthelloPlayer, BoardView, SearchState
+from Othello.bitboard import BOARD_SIZE, pack_boards, unpack_boards, get_moves, split_moves, play_actions, count_bits
 
 from threading import Thread, Event
+from collections import namedtuple
+
+from search_statistics import SearchStatistics
+
+
+# Points histogram of an analysis, incomplete when it was stopped before the end
+AnalysisResult = namedtuple('AnalysisResult', ['points', 'complete'])
+
+
+class AnalysisCancelled(Exception):
+    pass
 
 
 class MoveAnalysis(Thread):
-    def __init__(self, state, move, current_player, count_future_moves):
+    # Maximum number of nodes expanded between two checks of the stop request
+    CANCEL_CHECK_INTERVAL = 64
+    # Maximum number of distinct leaves kept to extend the analysis one more ply
+    MAX_FRONTIER_SIZE = 50000
+    # Number of nodes of the ply before the last whose children are counted together
+    LEAF_BATCH_SIZE = 128
+
+    def __init__(self, state, move, current_player, count_future_moves, statistics=None, log_statistics=False,
+                 cancel_check_interval=CANCEL_CHECK_INTERVAL, max_frontier_size=MAX_FRONTIER_SIZE,
+                 leaf_batch_size=LEAF_BATCH_SIZE):
         self.state = np.copy(state)
         self.move = move
 
@@ -14,79 +35,450 @@ class MoveAnalysis(Thread):
         self.count_future_moves = count_future_moves
         self.points_before = OthelloGame.get_board_players_points(self.state)[self.player]
 
+        # Statistics can be shared between analyses to aggregate their counters
+        self.statistics = statistics or SearchStatistics()
+        self.log_statistics = log_statistics
+
+        self.cancel_check_interval = cancel_check_interval
+        self._nodes_until_cancel_check = cancel_check_interval
+        self.max_frontier_size = max_frontier_size
+        self.leaf_batch_size = leaf_batch_size
+        # Leaves are counted on bitboards, which only fit 8x8 boards
+        self._batch_leaves = self.state.shape[:2] == (BOARD_SIZE, BOARD_SIZE)
+
+        # Node after the move, the points of each ply are kept to answer any depth already analysed
+        self._root = None
+        self._analysed_depth = -1
+        self._ply_points = []
+        self._terminal_points = []
+        # Number of lines of each distinct leaf of the analysed depth, None if they didn't fit
+        self._frontier = None
+
         self._has_finished = False
         self._points = {}
         self._stop_event = Event()
+        self._done_event = Event()
         self._result = None
 
         super().__init__(daemon=True)
     
     def run(self):
-        if self.start_analysis():
+        self.analyse(self.count_future_moves)
+
+    def analyse(self, count_future_moves):
+        """Analyse the move until a depth, in the calling thread
+
+        A depth already analysed is answered from the stored points, a deeper one
+        only expands the leaves of the last depth analysed.
+
+        Args:
+            count_future_moves ([int]): Depth of the analysis
+
+        Returns:
+            [dict]: Number of lines ending in each points difference, None if it was stopped
+        """
+        self.count_future_moves = count_future_moves
+        self._has_finished = False
+        self._result = None
+        self._done_event.clear()
+        # Statistics already running, like the ones of all the actions of a request, are stopped by their owner
+        owns_statistics = not self.statistics.is_running()
+        self.statistics.start()
+        try:
+            completed = self.start_analysis()
+        finally:
+            if owns_statistics:
+                self.statistics.stop()
+            self._done_event.set()
+        if self.log_statistics:
+            self.statistics.log('move_analysis', move=[int(i) for i in self.move],
+                                depth=self.count_future_moves, completed=bool(completed))
+        if completed:
             self._result = self._points
-            self._stop_event.set()
+            self._has_finished = True
+        return self._result
 
     def stop(self):
+        """Request the analysis to stop, at most cancel_check_interval nodes are expanded after it"""
         self._stop_event.set()
 
+    def resume(self):
+        """Clear a previous stop request, so the analysis can be extended to another depth"""
+        self._stop_event.clear()
+
     def has_finished(self):
         return self._has_finished
 
+    def get_analysed_depth(self):
+        return self._analysed_depth
+
     def get_result(self):
-        self._stop_event.wait()
+        """Wait for the analysis to finish or stop
+
+        Returns:
+            [dict]: Number of lines ending in each points difference, None if it was stopped
+        """
+        self._done_event.wait()
         return self._result
 
+    def get_partial_result(self):
+        """Wait for the analysis to finish or stop, after it has started
+
+        Returns:
+            [AnalysisResult]: Lines counted until the analysis has finished or stopped
+        """
+        self._done_event.wait()
+        return AnalysisResult(dict(self._points), self._has_finished)
+
+    def get_depth_points(self, depth):
+        """Get the points of a depth already analysed
+
+        Args:
+            depth ([int]): Depth of the analysis, at most the analysed depth
+
+        Returns:
+            [dict]: Number of lines ending in each points difference
+        """
+        if not 0 <= depth <= self._analysed_depth:
+            raise ValueError(f'Depth {depth} was not analysed')
+        points = self.get_terminal_points(depth)
+        for points_delta, lines in self._ply_points[depth].items():
+            points[points_delta] = points.get(points_delta, 0) + lines
+        return points
+
+    def get_terminal_points(self, depth):
+        """Get the points of the lines that end the game until a depth already analysed
+
+        Returns:
+            [dict]: Number of lines ending in each points difference
+        """
+        points = {}
+        for terminal_points in self._terminal_points[:depth + 1]:
+            for points_delta, lines in terminal_points.items():
+                points[points_delta] = points.get(points_delta, 0) + lines
+        return points
+
+    def get_leaves(self):
+        """Get the distinct nodes ending the lines of the analysed depth, the game not finished
+
+        Returns:
+            [list]: (SearchState, number of lines) of each leaf, None if they didn't fit
+        """
+        if self._frontier is None:
+            return None
+        return [(self._get_key_state(key), lines) for key, lines in self._frontier.items()]
+
+    def expand_leaves(self, leaves, source_depth, count_future_moves):
+        """Count the lines through some leaves until a deeper depth, nothing is stored
+
+        The leaves of a depth can be split between analyses of the same move, the
+        points of the depth are the sum of their results and of the terminal points
+        until the source depth.
+
+        Args:
+            leaves ([iterable]): (SearchState, number of lines) of each leaf, as get_leaves
+            source_depth ([int]): Depth of the leaves
+            count_future_moves ([int]): Depth of the analysis
+
+        Returns:
+            [dict]: Number of lines through the leaves ending in each points difference
+
+        Raises:
+            AnalysisCancelled: The analysis was stopped
+        """
+        self.count_future_moves = count_future_moves
+        self._points = {}
+        self._start_search(source_depth, count_future_moves, keep_frontier=False)
+        try:
+            for state, lines in leaves:
+                self._lines = lines
+                self.future_moves(state, source_depth)
+            self._count_leaves()
+        finally:
+            self._search_ply_points = self._search_terminal_points = None
+        return self._points
+
     def start_analysis(self):
-        OthelloGame.flip_board_squares(self.state, self.player, *self.move)
+        if self._root is None:
+            self._start_root()
+
+        depth = self.count_future_moves
+        if depth <= self._analysed_depth:
+            self._points = self.get_depth_points(depth)
+            return True
+
+        # Without the leaves of the last depth the search starts again from the move
+        if self._frontier is not None:
+            source, source_depth = self._frontier.items(), self._analysed_depth
+        else:
+            source, source_depth = [(self._get_state_key(self._root), 1)], 0
+
+        # Lines ended before the source depth are kept, the partial result grows from them
+        self._points = self.get_terminal_points(source_depth)
+        self._start_search(source_depth, depth)
+        try:
+            for key, lines in list(source):
+                self._lines = lines
+                self.future_moves(self._get_key_state(key), source_depth)
+            self._count_leaves()
+        except AnalysisCancelled:
+            return False
+
+        # The stored plies are only replaced once the search has finished
+        del self._ply_points[source_depth + 1:], self._terminal_points[source_depth + 1:]
+        self._ply_points.extend(self._search_ply_points)
+        self._terminal_points.extend(self._search_terminal_points)
+        self._frontier = self._search_frontier
+        self._analysed_depth = depth
+        self._search_ply_points = self._search_terminal_points = self._search_frontier = None
+        self._points = self.get_depth_points(depth)
+        return True
+
+    def _start_search(self, source_depth, depth, keep_frontier=True):
+        self._source_depth = source_depth
+        self._search_ply_points = [{} for _ in range(source_depth, depth)]
+        self._search_terminal_points = [{} for _ in range(source_depth, depth)]
+        self._search_frontier = {} if keep_frontier else None
+        # Nodes whose children are the leaves, with their number of lines
+        self._leaf_parents = []
+        self._leaf_parents_lines = []
+
+    def _start_root(self):
+        state = SearchState(self.state, self.player).child(*self.move)
+        self.state = state.board
+        self.statistics.add_node(0)
+        points = {state.points[self.player] - self.points_before: 1}
 
         # Checar se o adversário tem jogada ou se acabou o jogo
-        current_player = self.player.opponent
-        can_new_player_play = OthelloGame.has_player_actions_on_board(self.state, current_player)
+        if not state.has_actions():
+            if not state.has_actions(state.player.opponent):
+                self.statistics.terminals += 1
+                self._ply_points, self._terminal_points = [{}], [points]
+                self._frontier = {}
+                self._analysed_depth = 0
+                self._root = state
+                return
+            else:
+                self.statistics.passes += 1
+                state.pass_turn()
+
+        self._ply_points, self._terminal_points = [points], [{}]
+        self._frontier = {self._get_state_key(state): 1}
+        self._analysed_depth = 0
+        self._root = state
 
-        if not can_new_player_play:
-            can_previous_player_play = OthelloGame.has_player_actions_on_board(self.state, current_player.opponent)
+    def future_moves(self, state, count):
+        count += 1
+        if count == self.count_future_moves and self._batch_leaves:
+            # The children are leaves, they're counted in batches
+            self._leaf_parents.append(state)
+            self._leaf_parents_lines.append(self._lines)
+            if len(self._leaf_parents) >= self.leaf_batch_size:
+                self._count_leaves()
+            return True
 
-            if not can_previous_player_play:
-                points_now =  OthelloGame.get_board_players_points(self.state)[self.player]
-                # adicionando no dicionario
-                self._points[points_now - self.points_before] = self._points.get(points_now - self.points_before, 0) + 1
-                return self._points
+        index = count - self._source_depth - 1
+        for move in state.get_valid_actions():
+            self._nodes_until_cancel_check -= 1
+            self._check_stop()
+
+            child = state.child(*move)
+            self.statistics.add_node(count)
+            # Checar se o adversário tem jogada ou se acabou o jogo
+            has_finished = False
+
+            if not child.has_actions():
+                if not child.has_actions(child.player.opponent):
+                    has_finished = True
+                    self.statistics.terminals += 1
+                else:
+                    child.pass_turn()
+                    self.statistics.passes += 1
+
+            points_delta = child.points[self.player] - self.points_before
+            if has_finished:
+                self._add_lines(self._search_terminal_points[index], points_delta)
+                self._add_leaf(points_delta)
             else:
-                current_player = current_player.opponent
+                self._add_lines(self._search_ply_points[index], points_delta)
+                if count == self.count_future_moves:
+                    self._add_leaf(points_delta)
+                    self._add_to_frontier(self._get_state_key(child), self._lines)
+                else:
+                    self.future_moves(child, count)
+        return True
 
-        return self.future_moves(self.state, current_player, count=0)
+    def _count_leaves(self):
+        """Count the children of the batched nodes in vectorized passes
 
+        The children are made on bitboards, and their points differences are summed
+        in histograms weighted by the lines of their parent. Only the children kept
+        in the frontier are converted back to boards. Each pass expands at most the
+        nodes left before the next check of the stop request.
+        """
+        parents, parents_lines = self._leaf_parents, self._leaf_parents_lines
+        if not parents:
+            return
+        self._leaf_parents, self._leaf_parents_lines = [], []
 
-    def future_moves(self, state, current_player, count):
-        if count == self.count_future_moves or self.has_finished():
-            return True
+        bitboards = pack_boards(np.stack([parent.board for parent in parents]))
+        black_to_move = np.array([parent.player is OthelloPlayer.BLACK for parent in parents])
+        black, white = bitboards[OthelloPlayer.BLACK], bitboards[OthelloPlayer.WHITE]
+        own = np.where(black_to_move, black, white)
+        opponent = np.where(black_to_move, white, black)
+        # Exact while the lines are below 2 ** 53
+        parents_lines = np.array(parents_lines, dtype=np.float64)
+
+        # A row per child: index of its parent and square of its action
+        parent_indexes, actions = split_moves(get_moves(own, opponent))
+        start = 0
+        while start < len(actions):
+            self._check_stop()
+            end = min(start + max(self._nodes_until_cancel_check, 1), len(actions))
+            self._nodes_until_cancel_check -= end - start
+            indexes = parent_indexes[start:end]
+            self._count_children(own[indexes], opponent[indexes], actions[start:end], black_to_move[indexes],
+                                 parents_lines[indexes])
+            start = end
+
+    def _count_children(self, own, opponent, actions, black_to_move, lines):
+        mover, waiting = play_actions(own, opponent, actions)
+
+        waiting_can_move = get_moves(waiting, mover) != 0
+        mover_can_move = get_moves(mover, waiting) != 0
+        has_finished = ~waiting_can_move & ~mover_can_move
+        has_passed = ~waiting_can_move & mover_can_move
+
+        player_is_mover = black_to_move == (self.player is OthelloPlayer.BLACK)
+        points_deltas = count_bits(np.where(player_is_mover, mover, waiting)) - self.points_before
+
+        count = self.count_future_moves
+        index = count - self._source_depth - 1
+        squares_count = self.state.shape[0] * self.state.shape[1]
+        for children, ply_points in ((has_finished, self._search_terminal_points[index]),
+                                     (~has_finished, self._search_ply_points[index])):
+            histogram = np.bincount(points_deltas[children] + squares_count, weights=lines[children],
+                                    minlength=2 * squares_count + 1)
+            for bin_index in np.flatnonzero(histogram):
+                points_delta, bin_lines = int(bin_index) - squares_count, int(round(histogram[bin_index]))
+                ply_points[points_delta] = ply_points.get(points_delta, 0) + bin_lines
+                self._points[points_delta] = self._points.get(points_delta, 0) + bin_lines
+
+        self.statistics.add_nodes(count, len(actions))
+        self.statistics.leaves += len(actions)
+        self.statistics.terminals += int(np.count_nonzero(has_finished))
+        self.statistics.passes += int(np.count_nonzero(has_passed))
+
+        if self._search_frontier is not None:
+            self._add_children_to_frontier(~has_finished, mover, waiting, black_to_move, has_passed, lines)
+
+    def _check_stop(self):
+        # The stop request is checked once the nodes between two checks have been expanded
+        if self._nodes_until_cancel_check <= 0:
+            self._nodes_until_cancel_check = self.cancel_check_interval
+            if self._stop_event.is_set():
+                raise AnalysisCancelled()
+
+    def _add_children_to_frontier(self, children, mover, waiting, black_moved, has_passed, lines):
+        black_moved = black_moved[children]
+        mover, waiting = mover[children], waiting[children]
+        packed_boards = OthelloGame.pack_board(unpack_boards({
+            OthelloPlayer.BLACK: np.where(black_moved, mover, waiting),
+            OthelloPlayer.WHITE: np.where(black_moved, waiting, mover),
+        }))
+        # The opponent of the mover plays next, unless it passes
+        black_to_move = black_moved == has_passed[children]
+        players = np.where(black_to_move, OthelloPlayer.BLACK.value, OthelloPlayer.WHITE.value).tolist()
+        for packed_board, player, child_lines in zip(packed_boards, players, lines[children].tolist()):
+            self._add_to_frontier((packed_board.tobytes(), player), int(child_lines))
+            if self._search_frontier is None:
+                return
+
+    def _add_lines(self, points, points_delta):
+        points[points_delta] = points.get(points_delta, 0) + self._lines
+
+    def _add_leaf(self, points_delta):
+        self._add_lines(self._points, points_delta)
+        self.statistics.leaves += 1
+
+    def _add_to_frontier(self, key, lines):
+        if self._search_frontier is None:
+            return
+        if key in self._search_frontier:
+            self._search_frontier[key] += lines
+        elif len(self._search_frontier) < self.max_frontier_size:
+            self._search_frontier[key] = lines
         else:
-            count += 1
-            possible_moves = OthelloGame.get_player_valid_actions(state, current_player)
-            for move in possible_moves:
-                if self._stop_event.is_set():
-                    return False
-
-                board = np.copy(state)
-                OthelloGame.flip_board_squares(board, current_player, *move)
-                # Checar se o adversário tem jogada ou se acabou o jogo
-                new_player = current_player.opponent
-                can_new_player_play = OthelloGame.has_player_actions_on_board(board, new_player)
-
-                if not can_new_player_play:
-                    can_previous_player_play = OthelloGame.has_player_actions_on_board(board, new_player.opponent)
-
-                    if not can_previous_player_play:
-                        self._has_finished = True
-                    else:
-                        new_player = new_player.opponent 
-
-                if count == self.count_future_moves or self.has_finished():
-                    points_now =  OthelloGame.get_board_players_points(board)[self.player]
-                    self._points[points_now - self.points_before] = self._points.get(points_now - self.points_before, 0) + 1
-                    
-                self.future_moves(board, new_player, count)
-            return True
+            self._search_frontier = None
+
+    @staticmethod
+    def _get_state_key(state):
+        # Only the packed board is kept, the other fields of the node are computed again from it
+        return OthelloGame.pack_board(state.board).tobytes(), state.player.value
+
+    def _get_key_state(self, key):
+        packed_board, player = key
+        board = OthelloGame.unpack_board(packed_board, self.state.shape[0]).astype(self.state.dtype, copy=False)
+        return SearchState(board, OthelloPlayer(player))
+
+
+def analyse_position(state, current_player, count_future_moves, statistics=None):
+    """Calculate the lottery of every valid action of a position, in the calling thread
+
+    Args:
+        state (ndarray(board_size, board_size, 2)): Two-channels board
+        current_player ([OthelloPlayer]): Player to move
+        count_future_moves ([int]): Depth of the analysis
+        statistics ([SearchStatistics], optional): Counters shared by the analyses
+
+    Returns:
+        [dict]: Normalized lottery of each valid action (row, col)
+    """
+    lotteries = {}
+    for action in OthelloGame.get_player_actions_gains(state, current_player):
+        analysis = MoveAnalysis(state, action, current_player, count_future_moves, statistics=statistics)
+        analysis.run()
+        lotteries[action] = normalize_lottery(analysis.get_result())
+    return lotteries
+
+
+def normalize_lottery(points):
+    """Convert the counts of each points difference into probabilities
+
+    Args:
+        points ([dict]): Number of lines ending in each points difference
+
+    Returns:
+        [dict]: Probability of each points difference
+    """
+    total = sum(points.values())
+    return {p: points[p] / total for p in points}
+
+
+def get_best_action(lotteries, exponential_utility_factor=0):
+    """Get the action whose lottery has the highest utility
+
+    Args:
+        lotteries ([dict]): Normalized lottery of each action
+        exponential_utility_factor ([int]): Risk factor of the utility function, 0 is risk neutral
+
+    Returns:
+        [tuple]: Best action (row, col)
+    """
+    return max(lotteries, key=lambda a: get_lottery_utility(lotteries[a], exponential_utility_factor))
+
+
+def get_lottery_utility(lottery, exponential_utility_factor=0):
+    return sum(get_utility_value(value, exponential_utility_factor) * probability
+               for value, probability in lottery.items())
+
+
+def get_utility_value(value, exponential_utility_factor=0):
+    value = value/63
+    if exponential_utility_factor == 0:
+        return value
+    else:
+        return (1-np.exp(-(-exponential_utility_factor/10) * value))/ (-exponential_utility_factor/10)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,270 @@
+import sys
+import math
+import argparse
+
+from functools import partial
+
+from PyQt5.QtWidgets import QApplication, QWidget, QGroupBox, QGridLayout, QVBoxLayout, QLabel, QStatusBar
+from PyQt5.QtCore import QTimer, Qt, pyqtSignal
+
+from Widgets import BoardWidget, BoardRenderMode
+from Othello import OthelloPlayer
+from listener import OthelloListener, ListenerCallback
+from analysis_server import AnalysisServer
+from frame_scheduler import FrameScheduler, UiUpdate
+from game_tracker import GameTracker
+from game_records import format_move
+from move_analysis import get_best_action
+
+
+# Analyses of our own turn are taken from the queue first, then the other turns of our games
+OWN_TURN_PRIORITY = 2
+OWN_TABLE_PRIORITY = 1
+OBSERVED_PRIORITY = 0
+
+
+class TableSession:
+    """Game followed at a table: its listener, tracked game and last analysis"""
+
+    def __init__(self, index, table, listener):
+        self.index = index
+        self.table = table
+        self.listener = listener
+        self.tracker = GameTracker()
+        self.players = ()
+        self.current_player = None
+        self.is_closed = False
+        # Only the answer of the last request is shown
+        self.future = None
+        self.request_number = 0
+        self.priority = None
+        self.lotteries = {}
+        self.error = None
+
+
+class TableView(QGroupBox):
+    """Board of a table with its valid actions and best action"""
+
+    def __init__(self, title, board_size=400, parent=None):
+        super().__init__(title, parent)
+        layout = QVBoxLayout(self)
+        self._board_widget = BoardWidget(8, size=board_size, render_mode=BoardRenderMode.PAINTER)
+        self._status_label = QLabel()
+        layout.addWidget(self._board_widget, alignment=Qt.AlignCenter)
+        layout.addWidget(self._status_label)
+
+    def set_board(self, board, highlight_squares, status):
+        self._board_widget.set_board(board, highlight_squares=highlight_squares)
+        self._status_label.setText(status)
+
+
+class MultiTableApplication(QApplication):
+    """Follow several tables at once, each with its own Chrome window
+
+    The positions of every table are analysed by a single AnalysisServer, so they
+    share its worker pool and result cache. Our own turn has the highest priority,
+    then the other turns of our games, then the observed games.
+    """
+    BEST_ACTION_COLOR = '#db5c5c'
+    VALID_ACTIONS_COLOR = '#6edb5c'
+
+    STATUSBAR_UPDATE_INTERVAL = 250  # ms
+
+    # table index, listener event, result
+    table_event = pyqtSignal(int, object, object)
+    # table index, request number, future of the analysis
+    analysis_finished = pyqtSignal(int, int, object)
+
+    def __init__(self, tables, depth_level=3, processes=None, user=None, exponential_utility_factor=0,
+                 board_size=400):
+        """Open a listener per table
+
+        Args:
+            tables ([list]): Table ids or page URLs
+            depth_level ([int]): Depth of the analyses
+            processes ([int], optional): Number of worker processes, if None use the CPU count
+            user ([str], optional): Name of our player, if None it's read from the logged user
+            exponential_utility_factor ([int]): Risk factor of the best actions
+            board_size ([int]): Size of each board view in pixels
+        """
+        super().__init__(sys.argv)
+        self.depth_level = depth_level
+        self.user = user
+        self.exponential_utility_factor = exponential_utility_factor
+
+        self._analysis_server = AnalysisServer(processes)
+        self.aboutToQuit.connect(self._close)
+        self.table_event.connect(self._table_callback)
+        self.analysis_finished.connect(self._analysis_callback)
+
+        self._scheduler = FrameScheduler(parent=self)
+        self._scheduler.register(UiUpdate.BOARD, self._draw_tables)
+        self._scheduler.register(UiUpdate.STATUSBAR, self._update_statusbar)
+        self._dirty_tables = set()
+
+        self._window = QWidget()
+        self._window.setWindowTitle('Othello Analysis - Tables')
+        layout = QGridLayout(self._window)
+        columns = math.ceil(math.sqrt(len(tables)))
+
+        self._sessions = []
+        self._views = []
+        for index, table in enumerate(tables):
+            page = table if str(table).startswith('http') else OthelloListener.TABLE_PAGE.format(table)
+            listener = OthelloListener(page)
+            for type_ in (ListenerCallback.USER_LOGGED, ListenerCallback.PLAYERS, ListenerCallback.CURRENT_PLAYER,
+                          ListenerCallback.BOARD, ListenerCallback.CLOSE):
+                listener.register_callback(type_, partial(self.table_event.emit, index))
+            self._sessions.append(TableSession(index, table, listener))
+            self._views.append(TableView(f'Table {table}', board_size))
+            layout.addWidget(self._views[-1], index // columns, index % columns)
+
+        self._statusbar = QStatusBar()
+        layout.addWidget(self._statusbar, math.ceil(len(tables) / columns), 0, 1, columns)
+        self._statusbar_timer = QTimer()
+        self._statusbar_timer.timeout.connect(lambda: self._scheduler.mark_dirty(UiUpdate.STATUSBAR))
+        self._statusbar_timer.start(self.STATUSBAR_UPDATE_INTERVAL)
+
+    def run(self):
+        for session in self._sessions:
+            session.listener.start()
+            self._dirty_tables.add(session.index)
+        self._scheduler.mark_dirty(UiUpdate.BOARD)
+        self._window.show()
+        return self.exec_()
+
+    def _close(self):
+        for session in self._sessions:
+            session.listener.stop()
+        self._analysis_server.close()
+
+    def _table_callback(self, index, event, result):
+        session = self._sessions[index]
+        if event is ListenerCallback.USER_LOGGED:
+            if result and self.user is None:
+                self.user = result
+                for other in self._sessions:
+                    self._request_analysis(other)
+        elif event is ListenerCallback.PLAYERS:
+            if result:
+                session.players = result
+                self._request_analysis(session)
+        elif event is ListenerCallback.CURRENT_PLAYER:
+            if result:
+                session.current_player = result
+                self._request_analysis(session)
+        elif event is ListenerCallback.BOARD:
+            session.tracker.update(result)
+            self._request_analysis(session, position_changed=True)
+        elif event is ListenerCallback.CLOSE:
+            session.is_closed = True
+            if all(s.is_closed for s in self._sessions):
+                self.quit()
+        self._dirty_tables.add(index)
+        self._scheduler.mark_dirty(UiUpdate.BOARD)
+
+    def _get_priority(self, session):
+        if self.user is None or self.user not in session.players:
+            return OBSERVED_PRIORITY
+        return OWN_TURN_PRIORITY if session.current_player == self.user else OWN_TABLE_PRIORITY
+
+    def _request_analysis(self, session, position_changed=False):
+        if session.tracker.game.has_finished():
+            self._cancel_analysis(session)
+            session.lotteries = {}
+            return
+        priority = self._get_priority(session)
+        if not position_changed and (session.lotteries or priority == session.priority):
+            return
+
+        # The new request is made before the previous one is cancelled, so a job of
+        # the same position is kept and only raised to the new priority
+        previous_future = session.future
+        session.request_number += 1
+        session.priority = priority
+        if position_changed:
+            session.lotteries, session.error = {}, None
+        session.future = self._analysis_server.submit(session.tracker.board, session.tracker.player,
+                                                      self.depth_level, priority)
+        session.future.add_done_callback(partial(self._emit_analysis, session.index, session.request_number))
+        if previous_future is not None:
+            previous_future.cancel()
+
+    def _cancel_analysis(self, session):
+        if session.future is not None:
+            session.future.cancel()
+            session.future = None
+            session.request_number += 1
+
+    def _emit_analysis(self, index, request_number, future):
+        # Called from the dispatcher thread of the server
+        if not future.cancelled():
+            self.analysis_finished.emit(index, request_number, future)
+
+    def _analysis_callback(self, index, request_number, future):
+        session = self._sessions[index]
+        if request_number != session.request_number:
+            return  # Superseded by a newer request
+        session.future = None
+        if future.exception() is not None:
+            session.error = future.exception()
+        else:
+            session.lotteries = future.result()[0]
+        self._dirty_tables.add(index)
+        self._scheduler.mark_dirty(UiUpdate.BOARD)
+
+    def _draw_tables(self):
+        dirty_tables, self._dirty_tables = self._dirty_tables, set()
+        for index in sorted(dirty_tables):
+            session, view = self._sessions[index], self._views[index]
+            tracker = session.tracker
+            highlight_squares = {}
+            if not tracker.game.has_finished():
+                highlight_squares.update({a: self.VALID_ACTIONS_COLOR for a in tracker.game.get_valid_actions()})
+            if session.lotteries:
+                best_action = get_best_action(session.lotteries, self.exponential_utility_factor)
+                highlight_squares[best_action] = self.BEST_ACTION_COLOR
+                status = f'Best action {format_move(best_action)}'
+            elif session.error is not None:
+                status = f'Analysis failed: {session.error!r}'
+            elif session.future is not None:
+                status = 'Calculating best action...'
+            else:
+                status = ''
+
+            if session.is_closed:
+                status = 'Window closed'
+            elif tracker.game.has_finished():
+                points = tracker.game.get_players_points()
+                status = f'Finished {points[OthelloPlayer.BLACK]} - {points[OthelloPlayer.WHITE]}'
+            else:
+                status = f'{tracker.player.name.capitalize()} to move. {status}'
+            if self.user is not None and self.user in session.players:
+                status = f'{status} (own game)'
+            players = ' vs '.join(session.players)
+            view.setTitle(f'Table {session.table}: {players}' if players else f'Table {session.table}')
+            view.set_board(tracker.game.board(), highlight_squares, status)
+
+    def _update_statusbar(self):
+        metrics = self._analysis_server.get_metrics()
+        self._statusbar.showMessage(f'Queued {metrics["queued"]}, running {metrics["running"]}, '
+                                    f'cached {metrics["cached"]}, cache hits {metrics["cache_hits"]}, '
+                                    f'coalesced {metrics["coalesced"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Follow and analyse several Board Game Arena tables at once')
+    parser.add_argument('tables', nargs='+', help='Table ids or page URLs')
+    parser.add_argument('--depth', type=int, default=3, help='Depth level of the analyses')
+    parser.add_argument('--processes', type=int, help='Number of worker processes, CPU count by default')
+    parser.add_argument('--user', help='Name of our player, the logged user by default')
+    parser.add_argument('--risk', type=int, default=0, help='Exponential utility factor, from -150 to 150')
+    parser.add_argument('--board-size', type=int, default=400, help='Size of each board in pixels')
+    args = parser.parse_args()
+
+    app = MultiTableApplication(args.tables, args.depth, args.processes, args.user, args.risk, args.board_size)
+    sys.exit(app.run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import time
+import argparse
+import numpy as np
+
+from collections import namedtuple
+from multiprocessing import Pool
+
+from Othello import OthelloGame, OthelloPlayer, SearchState
+
+from search_statistics import SearchStatistics
+
+
+class PerftResult(namedtuple('PerftResult', ['nodes', 'passes', 'game_ends'])):
+    __slots__ = ()
+
+    def __add__(self, other):
+        return PerftResult(*(a + b for a, b in zip(self, other)))
+
+
+EMPTY_PERFT_RESULT = PerftResult(0, 0, 0)
+
+BOARD_STRING_PIECES = {
+    'X': OthelloPlayer.BLACK.value, 'x': OthelloPlayer.BLACK.value, '*': OthelloPlayer.BLACK.value,
+    'O': OthelloPlayer.WHITE.value, 'o': OthelloPlayer.WHITE.value,
+    '-': 0, '.': 0,
+}
+
+
+def perft(board, player, depth, hash_table=None, statistics=None):
+    """Count the positions reachable from a board
+
+    A pass consumes one ply, like a regular move. Positions where neither
+    player can play are counted as leaf nodes even before reaching the depth.
+
+    Args:
+        board (ndarray(board_size, board_size, 2)): Two-channels board
+        player ([OthelloPlayer]): Player to move
+        depth ([int]): Number of plies to explore
+        hash_table ([dict], optional): Transposition table shared between calls,
+            if None no transposition is detected
+        statistics ([SearchStatistics], optional): Counters of the transposition table accesses
+
+    Returns:
+        [PerftResult]: Leaf nodes, passes and game ends found until the depth
+    """
+    return _perft(SearchState(board, player), depth, hash_table, statistics)
+
+
+def divide(state):
+    """Get the children of a search node, considering a pass as a move
+
+    Args:
+        state ([SearchState]): Search node
+
+    Returns:
+        [list]: List of (move, child node, is pass), where move is None for a pass.
+            The list is empty when the game has ended
+    """
+    children = [(action, state.child(*action), False) for action in state.get_valid_actions()]
+
+    if not children and state.has_actions(state.player.opponent):
+        child = SearchState(state.board, state.player, state.points, state.frontier)
+        child.pass_turn()
+        children.append((None, child, True))
+
+    return children
+
+
+def parallel_perft(board, player, depth, processes=None, use_hash=False):
+    """Count the positions reachable from a board splitting the root moves between processes
+
+    Args:
+        board (ndarray(board_size, board_size, 2)): Two-channels board
+        player ([OthelloPlayer]): Player to move
+        depth ([int]): Number of plies to explore
+        processes ([int], optional): Number of worker processes, if None use the CPU count
+        use_hash ([bool], optional): Enable a transposition table on each worker
+
+    Returns:
+        [PerftResult]: Leaf nodes, passes and game ends found until the depth
+    """
+    if depth < 2:
+        return perft(board, player, depth, {} if use_hash else None)
+
+    children = divide(SearchState(board, player))
+    if not children:
+        return PerftResult(1, 0, 1)
+
+    tasks = [(child.board, child.player, depth - 1, use_hash) for _, child, _ in children]
+    passes = sum(1 for *_, is_pass in children if is_pass)
+
+    with Pool(processes) as pool:
+        results = pool.starmap(_perft_task, tasks)
+
+    return sum(results, PerftResult(0, passes, 0))
+
+
+def parse_board_string(board_string, board_size=8):
+    """Parse a board written as a string of squares, row by row
+
+    Black pieces are 'X' or '*', white pieces are 'O' and free squares are '-' or '.'.
+    Any other character is ignored.
+
+    Args:
+        board_string ([str]): Board squares
+        board_size ([int]): Size of the board square
+
+    Returns:
+        [ndarray(board_size, board_size, 2)]: Two-channels board
+    """
+    squares = [BOARD_STRING_PIECES[c] for c in board_string if c in BOARD_STRING_PIECES]
+    if len(squares) != board_size ** 2:
+        raise ValueError(f'Expecting {board_size ** 2} squares, got {len(squares)}')
+    board = np.array(squares, dtype=int).reshape((board_size, board_size))
+    return OthelloGame.convert_to_two_channels_board(board)
+
+
+def format_board_string(board):
+    """Write a two-channels board as a string of squares, row by row, as read by parse_board_string
+
+    Args:
+        board (ndarray(board_size, board_size, 2)): Two-channels board
+
+    Returns:
+        [str]: 'X' for black pieces, 'O' for white pieces and '-' for free squares
+    """
+    pieces = {OthelloPlayer.BLACK.value: 'X', OthelloPlayer.WHITE.value: 'O', 0: '-'}
+    return ''.join(pieces[v] for v in OthelloGame.convert_to_one_channel_board(board).ravel().tolist())
+
+
+def _perft(state, depth, hash_table, statistics):
+    if depth == 0:
+        return PerftResult(1, 0, 0)
+
+    if hash_table is not None:
+        key = OthelloGame.pack_board(state.board).tobytes(), state.player.value, depth
+        result = hash_table.get(key)
+        if statistics is not None:
+            statistics.add_cache_access('hash', result is not None)
+        if result is None:
+            result = _perft_children(state, depth, hash_table, statistics)
+            hash_table[key] = result
+        return result
+
+    return _perft_children(state, depth, hash_table, statistics)
+
+
+def _perft_children(state, depth, hash_table, statistics):
+    children = divide(state)
+    if not children:
+        return PerftResult(1, 0, 1)
+
+    result = EMPTY_PERFT_RESULT
+    for _, child, is_pass in children:
+        result += _perft(child, depth - 1, hash_table, statistics)
+        if is_pass:
+            result += PerftResult(0, 1, 0)
+    return result
+
+
+def _perft_task(board, player, depth, use_hash):
+    return perft(board, player, depth, {} if use_hash else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count Othello positions reachable until a depth')
+    parser.add_argument('depth', type=int, help='Number of plies to explore')
+    parser.add_argument('--board', help='Board squares row by row (X/* black, O white, -/. free), '
+                                        'or a path to a file containing them')
+    parser.add_argument('--board-size', type=int, default=8, help='Size of the board square')
+    parser.add_argument('--player', choices=('black', 'white'), default='black', help='Player to move')
+    parser.add_argument('--hash', action='store_true', help='Enable the transposition table')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Number of worker processes splitting the root moves, 0 to use the CPU count')
+    args = parser.parse_args()
+
+    if args.board:
+        try:
+            with open(args.board) as file:
+                board_string = file.read()
+        except OSError:
+            board_string = args.board
+        board = parse_board_string(board_string, args.board_size)
+    else:
+        board = OthelloGame.initial_board(args.board_size)
+    player = OthelloPlayer.BLACK if args.player == 'black' else OthelloPlayer.WHITE
+
+    print(f'{"depth":>5} {"nodes":>14} {"passes":>10} {"game ends":>10} {"time (s)":>10} {"nodes/s":>12}')
+    for depth in range(1, args.depth + 1):
+        start = time.perf_counter()
+        statistics = SearchStatistics()
+        if args.processes == 1:
+            result = perft(board, player, depth, {} if args.hash else None, statistics)
+        else:
+            result = parallel_perft(board, player, depth, args.processes or None, args.hash)
+        elapsed = time.perf_counter() - start
+        nodes_per_second = result.nodes / elapsed if elapsed else float('inf')
+        print(f'{depth:>5} {result.nodes:>14} {result.passes:>10} {result.game_ends:>10} '
+              f'{elapsed:>10.3f} {nodes_per_second:>12.0f}', end='')
+        for cache, rate in statistics.cache_hit_rates.items():
+            print(f' {cache} hits {rate:.1%}', end='')
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+import math
+import time
+import argparse
+import numpy as np
+
+from enum import Enum, auto
+from threading import Event
+from collections import namedtuple
+
+from Othello import OthelloGame, OthelloPlayer, SearchState
+
+from move_analysis import get_utility_value
+from search_statistics import SearchStatistics
+
+
+class SearchMode(Enum):
+    # The opponent plays the action that is worst for the player
+    ALPHA_BETA = auto()
+    # The opponent plays any valid action with the same probability
+    EXPECTIMAX = auto()
+
+
+# Bound of a transposition table value
+EXACT_BOUND = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+# Best action of the deepest iteration completed, value is its expected utility
+SearchResult = namedtuple('SearchResult', ['action', 'value', 'depth'])
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+class SearchEngine:
+    """Best action search with pruning, move ordering, iterative deepening and a transposition table
+
+    The depth has the meaning of the analysis depth level: the lines have the action
+    plus depth moves, and a pass is not counted as a move. Leaves are valued with the
+    utility of the player's points difference, like the lotteries. With an evaluator,
+    they're valued with the utility of the estimated final pieces difference instead,
+    and the children of the last ply are evaluated in a single batch.
+    """
+    # Maximum number of nodes searched between two checks of the stop request
+    CANCEL_CHECK_INTERVAL = 256
+    MAX_TABLE_SIZE = 1000000
+
+    def __init__(self, mode=SearchMode.ALPHA_BETA, exponential_utility_factor=0, statistics=None,
+                 max_table_size=MAX_TABLE_SIZE, evaluator=None):
+        self.mode = mode
+        self.exponential_utility_factor = exponential_utility_factor
+        self.evaluator = evaluator
+        self.statistics = statistics or SearchStatistics()
+        self.max_table_size = max_table_size
+
+        # Values are relative to the root position, the table is kept while it doesn't change
+        self.transposition_table = {}
+        self._table_context = None
+
+        self._stop_event = Event()
+        self._nodes_until_cancel_check = self.CANCEL_CHECK_INTERVAL
+
+    def stop(self):
+        """Request the search to stop, the deepest iteration completed is kept"""
+        self._stop_event.set()
+
+    def resume(self):
+        """Clear a previous stop request"""
+        self._stop_event.clear()
+
+    def search(self, board, player, depth, callback=None):
+        """Search the best action, deepening one move at a time until the depth
+
+        Args:
+            board (ndarray(board_size, board_size, 2)): Two-channels board
+            player ([OthelloPlayer]): Player to move
+            depth ([int]): Depth of the last iteration
+            callback ([function], optional): Called with the SearchResult of each iteration
+
+        Returns:
+            [SearchResult]: Result of the deepest iteration completed, None if the player
+                has no valid action or the first iteration was stopped
+        """
+        root = SearchState(board, player)
+        if not root.has_actions():
+            return None
+
+        self.player = player
+        self.points_before = root.points[player]
+        squares = board.shape[0] * board.shape[1]
+        self._min_value = get_utility_value(-squares, self.exponential_utility_factor)
+        self._max_value = get_utility_value(squares, self.exponential_utility_factor)
+
+        table_context = (self.mode, self.exponential_utility_factor, OthelloGame.pack_board(board).tobytes(),
+                         player.value)
+        if table_context != self._table_context:
+            self.transposition_table.clear()
+            self._table_context = table_context
+
+        self.statistics.start()
+        result = None
+        try:
+            for iteration in range(depth + 1):
+                self._iteration = iteration
+                result = self._search_root(root, iteration)
+                if callback is not None:
+                    callback(result)
+        except SearchCancelled:
+            pass
+        finally:
+            self.statistics.stop()
+        return result
+
+    def _search_root(self, root, depth):
+        self.statistics.add_node(0)
+        key = self._get_state_key(root)
+        entry = self.transposition_table.get(key)
+        table_action = entry[3] if entry is not None else None
+
+        alpha = -math.inf
+        best_action, best_value = None, -math.inf
+        for action in self._order_actions(root, table_action):
+            child, has_finished = self._child(root, action)
+            value = self._search(child, depth, alpha, math.inf, has_finished)
+            if value > best_value:
+                best_action, best_value = action, value
+                alpha = value
+
+        self._store(key, depth + 1, best_value, EXACT_BOUND, best_action)
+        return SearchResult(best_action, best_value, depth)
+
+    def _search(self, state, depth, alpha, beta, has_finished):
+        self._nodes_until_cancel_check -= 1
+        if self._nodes_until_cancel_check <= 0:
+            self._nodes_until_cancel_check = self.CANCEL_CHECK_INTERVAL
+            if self._stop_event.is_set():
+                raise SearchCancelled()
+        self.statistics.add_node(self._iteration - depth + 1)
+
+        if has_finished or depth == 0:
+            self.statistics.leaves += 1
+            return self._evaluate(state, has_finished)
+
+        key = self._get_state_key(state)
+        entry = self.transposition_table.get(key)
+        self.statistics.add_cache_access('transposition', entry is not None)
+        table_action = None
+        if entry is not None:
+            entry_depth, value, bound, table_action = entry
+            # Values of a deeper search are different lines, only their action is reused
+            if entry_depth == depth:
+                if bound == EXACT_BOUND or (bound == LOWER_BOUND and value >= beta) \
+                        or (bound == UPPER_BOUND and value <= alpha):
+                    return value
+
+        if depth == 1 and self.evaluator is not None:
+            # Every child is evaluated anyway, so they're not ordered
+            actions = state.get_valid_actions()
+            leaf_values = self._evaluate_leaves(state, depth, actions)
+        else:
+            actions = self._order_actions(state, table_action)
+            leaf_values = None
+
+        if state.player is self.player:
+            value, action = self._max_node(state, depth, alpha, beta, actions, leaf_values)
+        elif self.mode is SearchMode.ALPHA_BETA:
+            value, action = self._min_node(state, depth, alpha, beta, actions, leaf_values)
+        else:
+            value, action = self._chance_node(state, depth, alpha, beta, actions, leaf_values)
+
+        if value <= alpha:
+            bound = UPPER_BOUND
+        elif value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT_BOUND
+        self._store(key, depth, value, bound, action)
+        return value
+
+    def _max_node(self, state, depth, alpha, beta, actions, leaf_values):
+        best_action, best_value = None, -math.inf
+        for action in actions:
+            value = self._action_value(state, action, depth, alpha, beta, leaf_values)
+            if value > best_value:
+                best_action, best_value = action, value
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+        return best_value, best_action
+
+    def _min_node(self, state, depth, alpha, beta, actions, leaf_values):
+        best_action, best_value = None, math.inf
+        for action in actions:
+            value = self._action_value(state, action, depth, alpha, beta, leaf_values)
+            if value < best_value:
+                best_action, best_value = action, value
+                beta = min(beta, value)
+                if alpha >= beta:
+                    break
+        return best_value, best_action
+
+    def _chance_node(self, state, depth, alpha, beta, actions, leaf_values):
+        # Star1: the values not searched yet are bounded by the utility range, the
+        # node is cut as soon as its average can't get inside the window
+        count = len(actions)
+        total = 0
+        for i, action in enumerate(actions):
+            remaining = count - i - 1
+            child_alpha = max(count * alpha - total - self._max_value * remaining, self._min_value)
+            child_beta = min(count * beta - total - self._min_value * remaining, self._max_value)
+            total += self._action_value(state, action, depth, child_alpha, child_beta, leaf_values)
+
+            if total + self._min_value * remaining >= count * beta:
+                return (total + self._min_value * remaining) / count, action
+            if total + self._max_value * remaining <= count * alpha:
+                return (total + self._max_value * remaining) / count, action
+        return total / count, None
+
+    def _action_value(self, state, action, depth, alpha, beta, leaf_values):
+        if leaf_values is not None:
+            return leaf_values[action]
+        child, has_finished = self._child(state, action)
+        return self._search(child, depth - 1, alpha, beta, has_finished)
+
+    def _child(self, state, action):
+        child = state.child(*action)
+        if not child.has_actions():
+            if not child.has_actions(child.player.opponent):
+                self.statistics.terminals += 1
+                return child, True
+            self.statistics.passes += 1
+            child.pass_turn()
+        return child, False
+
+    def _order_actions(self, state, table_action=None):
+        # Best action of a previous search first, then the actions that flip more pieces
+        gains = {a: OthelloGame.count_action_flips(state.board, state.player, *a) for a in state.get_valid_actions()}
+        actions = OthelloGame.get_ordered_player_actions(state.board, state.player, gains)
+        if table_action is not None and table_action in gains:
+            actions.remove(table_action)
+            actions.insert(0, table_action)
+        return actions
+
+    def _evaluate(self, state, has_finished):
+        if self.evaluator is None:
+            value = state.points[self.player] - self.points_before
+        elif has_finished:
+            value = state.points[self.player] - state.points[self.player.opponent]
+        else:
+            value = self.evaluator.evaluate(state.board[np.newaxis], self.player)[0]
+        return get_utility_value(value, self.exponential_utility_factor)
+
+    def _evaluate_leaves(self, state, depth, actions):
+        children = [self._child(state, action) for action in actions]
+        values = np.array([c.points[self.player] - c.points[self.player.opponent] for c, _ in children], dtype=float)
+        evaluated = [i for i, (_, has_finished) in enumerate(children) if not has_finished]
+        if evaluated:
+            boards = np.stack([children[i][0].board for i in evaluated])
+            values[evaluated] = self.evaluator.evaluate(boards, self.player)
+
+        ply = self._iteration - depth + 2
+        for _ in children:
+            self.statistics.add_node(ply)
+        self.statistics.leaves += len(children)
+        self._nodes_until_cancel_check -= len(children)
+        return {action: get_utility_value(value, self.exponential_utility_factor)
+                for action, value in zip(actions, values)}
+
+    def _store(self, key, depth, value, bound, action):
+        if len(self.transposition_table) >= self.max_table_size and key not in self.transposition_table:
+            self.transposition_table.clear()
+        self.transposition_table[key] = depth, value, bound, action
+
+    @staticmethod
+    def _get_state_key(state):
+        return OthelloGame.pack_board(state.board).tobytes(), state.player.value
+
+
+def main():
+    from perft import parse_board_string
+    from evaluation import PatternEvaluator
+
+    parser = argparse.ArgumentParser(description='Search the best Othello action with iterative deepening')
+    parser.add_argument('depth', type=int, help='Depth level of the last iteration')
+    parser.add_argument('--board', help='Board squares row by row (X/* black, O white, -/. free)')
+    parser.add_argument('--player', choices=('black', 'white'), default='black', help='Player to move')
+    parser.add_argument('--mode', choices=[m.name.lower() for m in SearchMode], default='alpha_beta',
+                        help='Opponent model of the search')
+    parser.add_argument('--risk', type=int, default=0, help='Exponential utility factor, from -150 to 150')
+    parser.add_argument('--patterns', action='store_true', help='Evaluate the leaves with the pattern tables')
+    args = parser.parse_args()
+
+    board = parse_board_string(args.board) if args.board else OthelloGame.initial_board(8)
+    player = OthelloPlayer.BLACK if args.player == 'black' else OthelloPlayer.WHITE
+    evaluator = PatternEvaluator.load() if args.patterns else None
+    engine = SearchEngine(SearchMode[args.mode.upper()], args.risk, evaluator=evaluator)
+    start = time.perf_counter()
+
+    def print_iteration(result):
+        print(f'depth {result.depth:>2}: action {result.action} value {result.value:+.4f} '
+              f'{time.perf_counter() - start:8.2f}s {engine.statistics}')
+
+    engine.search(board, player, args.depth, print_iteration)
+
+
+if __name__ == '__main__':
+    main()
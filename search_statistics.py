@@ -0,0 +1,139 @@
+import json
+import time
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class SearchStatistics:
+    """Counters of a search, they can be read while the search is running"""
+
+    def __init__(self):
+        self.nodes = 0
+        self.leaves = 0
+        self.passes = 0
+        self.terminals = 0
+        self.ply_nodes = []
+
+        self._cache_hits = {}
+        self._cache_misses = {}
+        # Start of the running interval, the time of the previous intervals is summed apart
+        self._start_time = None
+        self._stopped_elapsed = 0
+
+    def start(self):
+        """Start counting the elapsed time, if it's not running, the time between two runs isn't counted"""
+        if self._start_time is None:
+            self._start_time = time.perf_counter()
+
+    def stop(self):
+        """Stop counting the elapsed time"""
+        if self._start_time is not None:
+            self._stopped_elapsed += time.perf_counter() - self._start_time
+            self._start_time = None
+
+    def is_running(self):
+        """Check if the search is running
+
+        Returns:
+            [bool]: True if it has started and not stopped, otherwise False
+        """
+        return self._start_time is not None
+
+    def add_node(self, ply):
+        """Count a visited node
+
+        Args:
+            ply ([int]): Depth of the node, 0 is the analysed position
+        """
+        self.add_nodes(ply, 1)
+
+    def add_nodes(self, ply, count):
+        """Count visited nodes of the same ply
+
+        Args:
+            ply ([int]): Depth of the nodes, 0 is the analysed position
+            count ([int]): Number of nodes
+        """
+        self.nodes += count
+        while len(self.ply_nodes) <= ply:
+            self.ply_nodes.append(0)
+        self.ply_nodes[ply] += count
+
+    def add_cache_access(self, cache, hit):
+        """Count an access to a cache
+
+        Args:
+            cache ([str]): Name of the cache
+            hit ([bool]): True if the value was in cache
+        """
+        counters = self._cache_hits if hit else self._cache_misses
+        counters[cache] = counters.get(cache, 0) + 1
+
+    @property
+    def elapsed(self):
+        """Elapsed time in seconds, summed over the runs"""
+        if self._start_time is None:
+            return self._stopped_elapsed
+        return self._stopped_elapsed + time.perf_counter() - self._start_time
+
+    @property
+    def nodes_per_second(self):
+        """Visited nodes per second"""
+        elapsed = self.elapsed
+        return self.nodes / elapsed if elapsed else 0
+
+    @property
+    def branching_factors(self):
+        """Average number of children of the nodes of each ply"""
+        ply_nodes = list(self.ply_nodes)
+        return [ply_nodes[i + 1] / ply_nodes[i] for i in range(len(ply_nodes) - 1) if ply_nodes[i]]
+
+    @property
+    def cache_hit_rates(self):
+        """Rate of hits of each cache"""
+        caches = set(self._cache_hits) | set(self._cache_misses)
+        rates = {}
+        for cache in caches:
+            hits, misses = self._cache_hits.get(cache, 0), self._cache_misses.get(cache, 0)
+            rates[cache] = hits / (hits + misses)
+        return rates
+
+    def snapshot(self):
+        """Copy of the counters
+
+        Returns:
+            [dict]: Counters and derived rates
+        """
+        return {
+            'nodes': self.nodes,
+            'leaves': self.leaves,
+            'passes': self.passes,
+            'terminals': self.terminals,
+            'ply_nodes': list(self.ply_nodes),
+            'branching_factors': self.branching_factors,
+            'elapsed': self.elapsed,
+            'nodes_per_second': self.nodes_per_second,
+            'cache_hit_rates': self.cache_hit_rates,
+        }
+
+    def log(self, event, **fields):
+        """Emit the counters as a JSON log line
+
+        Args:
+            event ([str]): Name of the event logged
+            **fields: Extra fields added to the line
+        """
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'event': event, **fields, **self.snapshot()}))
+
+    def __str__(self):
+        text = f'{self.nodes:,} nodes, {self.leaves:,} leaves, {self.passes:,} passes, ' \
+               f'{self.terminals:,} endings, {self.nodes_per_second:,.0f} nodes/s, {self.elapsed:.1f}s'
+        branching_factors = self.branching_factors
+        if branching_factors:
+            text += ', branching ' + '/'.join(f'{b:.1f}' for b in branching_factors)
+        for cache, rate in self.cache_hit_rates.items():
+            text += f', {cache} hits {rate:.0%}'
+        return text
@@ -0,0 +1,190 @@
+import time
+import random
+import argparse
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from Othello import OthelloGame, OthelloPlayer, BoardView
+from move_analysis import analyse_position, get_best_action
+from search import SearchEngine
+from evaluation import PatternEvaluator
+
+
+GameResult = namedtuple('GameResult', ['seed', 'black', 'white', 'black_points', 'white_points', 'moves'])
+
+
+class RandomPolicy:
+    """Play any valid action"""
+    name = 'random'
+
+    def __call__(self, game, rng):
+        return rng.choice(game.get_valid_actions())
+
+    def __str__(self):
+        return self.name
+
+
+class GreedyPolicy:
+    """Play the action that flips more pieces, ties are broken at random"""
+    name = 'greedy'
+
+    def __call__(self, game, rng):
+        board = game.board(view=BoardView.TWO_CHANNELS)
+        return rng.choice(OthelloGame.get_greedy_actions(board, game.current_player))
+
+    def __str__(self):
+        return self.name
+
+
+class LotteryPolicy:
+    """Play the best action of the lotteries, as the application does"""
+    name = 'lottery'
+
+    def __init__(self, depth_level=2, exponential_utility_factor=0):
+        self.depth_level = depth_level
+        self.exponential_utility_factor = exponential_utility_factor
+
+    def __call__(self, game, rng):
+        board = game.board(view=BoardView.TWO_CHANNELS)
+        lotteries = analyse_position(board, game.current_player, self.depth_level)
+        return get_best_action(lotteries, self.exponential_utility_factor)
+
+    def __str__(self):
+        return f'{self.name}:{self.depth_level}:{self.exponential_utility_factor}'
+
+
+class SearchPolicy:
+    """Play the best action of an alpha-beta search, optionally with the pattern evaluation"""
+    name = 'search'
+
+    def __init__(self, depth_level=2, pattern_evaluation=0, exponential_utility_factor=0):
+        self.depth_level = depth_level
+        self.pattern_evaluation = pattern_evaluation
+        self.exponential_utility_factor = exponential_utility_factor
+        self._evaluator = None
+
+    def __call__(self, game, rng):
+        if self.pattern_evaluation and self._evaluator is None:
+            self._evaluator = PatternEvaluator.load()
+        board = game.board(view=BoardView.TWO_CHANNELS)
+        engine = SearchEngine(exponential_utility_factor=self.exponential_utility_factor, evaluator=self._evaluator)
+        return engine.search(board, game.current_player, self.depth_level).action
+
+    def __str__(self):
+        return f'{self.name}:{self.depth_level}:{self.pattern_evaluation}:{self.exponential_utility_factor}'
+
+
+POLICIES = {p.name: p for p in (RandomPolicy, GreedyPolicy, LotteryPolicy, SearchPolicy)}
+
+
+def parse_policy(text):
+    """Create a policy from its description
+
+    Args:
+        text ([str]): 'random', 'greedy', 'lottery[:depth level[:exponential utility factor]]'
+            or 'search[:depth level[:pattern evaluation 0 or 1[:exponential utility factor]]]'
+
+    Returns:
+        [callable]: Policy
+    """
+    name, *params = text.split(':')
+    if name not in POLICIES:
+        raise ValueError(f'Unknown policy {name}, expecting one of {", ".join(POLICIES)}')
+    return POLICIES[name](*map(int, params))
+
+
+def play_game(black_policy, white_policy, seed, board_size=8):
+    """Play a game between two policies
+
+    Args:
+        black_policy ([callable]): Policy of the black player
+        white_policy ([callable]): Policy of the white player
+        seed ([int]): Seed of the random choices, the same seed plays the same game
+        board_size ([int]): Size of the board square
+
+    Returns:
+        [GameResult]: Final points of the game
+    """
+    rng = random.Random(seed)
+    game = OthelloGame(board_size)
+    policies = {OthelloPlayer.BLACK: black_policy, OthelloPlayer.WHITE: white_policy}
+    moves = 0
+    while not game.has_finished():
+        game.play(*policies[game.current_player](game, rng))
+        moves += 1
+    points = game.get_players_points()
+    return GameResult(seed, str(black_policy), str(white_policy),
+                      points[OthelloPlayer.BLACK], points[OthelloPlayer.WHITE], moves)
+
+
+def run_self_play(policy, opponent_policy, games, seed=0, processes=None):
+    """Play games between two policies, switching colors at each game
+
+    Args:
+        policy ([callable]): Evaluated policy, black in even games
+        opponent_policy ([callable]): Opponent policy
+        games ([int]): Number of games
+        seed ([int]): Seed of the first game, game i uses seed + i
+        processes ([int], optional): Number of worker processes, if None use the CPU count
+
+    Returns:
+        [dict]: Wins, losses and draws of the policy, its mean disc margin and the games per second
+    """
+    blacks = [policy if i % 2 == 0 else opponent_policy for i in range(games)]
+    whites = [opponent_policy if i % 2 == 0 else policy for i in range(games)]
+    seeds = [seed + i for i in range(games)]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(processes) as executor:
+        results = list(executor.map(play_game, blacks, whites, seeds, chunksize=max(1, games // 64)))
+    elapsed = time.perf_counter() - start
+
+    wins = losses = draws = margin = 0
+    for i, result in enumerate(results):
+        game_margin = result.black_points - result.white_points
+        if i % 2:
+            game_margin = -game_margin
+        margin += game_margin
+        if game_margin > 0:
+            wins += 1
+        elif game_margin < 0:
+            losses += 1
+        else:
+            draws += 1
+
+    return {
+        'policy': str(policy),
+        'opponent': str(opponent_policy),
+        'games': games,
+        'wins': wins,
+        'losses': losses,
+        'draws': draws,
+        'win_rate': wins / games if games else 0,
+        'mean_margin': margin / games if games else 0,
+        'elapsed': elapsed,
+        'games_per_second': games / elapsed if elapsed else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play Othello games between two policies')
+    parser.add_argument('policy', help='Evaluated policy: random, greedy, lottery[:depth[:risk]] '
+                                       'or search[:depth[:patterns[:risk]]]')
+    parser.add_argument('opponent', help='Opponent policy, same format')
+    parser.add_argument('--games', type=int, default=100, help='Number of games, colors switch at each game')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the first game')
+    parser.add_argument('--processes', type=int, help='Number of worker processes, CPU count by default')
+    args = parser.parse_args()
+
+    stats = run_self_play(parse_policy(args.policy), parse_policy(args.opponent),
+                          args.games, args.seed, args.processes)
+    print(f'{stats["policy"]} vs {stats["opponent"]}: {stats["games"]} games')
+    print(f'wins {stats["wins"]}, losses {stats["losses"]}, draws {stats["draws"]} '
+          f'(win rate {stats["win_rate"]:.1%})')
+    print(f'mean disc margin {stats["mean_margin"]:+.2f}')
+    print(f'{stats["elapsed"]:.1f}s, {stats["games_per_second"]:.2f} games/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+import os
+import time
+import argparse
+import numpy as np
+
+from collections import namedtuple
+from multiprocessing import Process, SimpleQueue
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ProcessPoolExecutor
+
+from Othello import OthelloGame, OthelloPlayer, BoardView
+from move_analysis import MoveAnalysis, normalize_lottery
+
+
+# Columns of a task row: player value, action row, action col, depth
+TASK_COLUMNS = 4
+
+
+class SharedLayout(namedtuple('SharedLayout', ['capacity', 'board_size'])):
+    """Fixed layout of the shared memory: task boards, task rows and result histograms by slot
+
+    Histograms count the lines ending in each points difference, from -board_size ** 2
+    to board_size ** 2.
+    """
+    __slots__ = ()
+
+    @property
+    def histogram_size(self):
+        return 2 * self.board_size ** 2 + 1
+
+    @property
+    def histogram_offset(self):
+        return self.board_size ** 2
+
+    def get_sizes(self):
+        return (self.capacity * self.board_size ** 2 * 2,
+                self.capacity * TASK_COLUMNS * np.dtype(np.int32).itemsize,
+                self.capacity * self.histogram_size * np.dtype(np.int64).itemsize)
+
+    def get_size(self):
+        return sum(self.get_sizes())
+
+    def get_views(self, buffer):
+        """Get the arrays of a shared memory buffer
+
+        Returns:
+            [tuple]: Boards ndarray(capacity, board_size, board_size, 2), task rows
+                ndarray(capacity, 4) and histograms ndarray(capacity, histogram_size)
+        """
+        boards_size, tasks_size, _ = self.get_sizes()
+        boards = np.ndarray((self.capacity, self.board_size, self.board_size, 2), dtype=bool, buffer=buffer)
+        tasks = np.ndarray((self.capacity, TASK_COLUMNS), dtype=np.int32, buffer=buffer, offset=boards_size)
+        histograms = np.ndarray((self.capacity, self.histogram_size), dtype=np.int64, buffer=buffer,
+                                offset=boards_size + tasks_size)
+        return boards, tasks, histograms
+
+
+class SharedAnalysisPool:
+    """Worker processes running MoveAnalysis tasks on boards placed in shared memory
+
+    Task boards and result histograms live in a ring of slots of a shared memory
+    block, only slot indexes go through the queues, so dispatching a task and
+    collecting its result copy no arrays.
+    """
+
+    def __init__(self, processes=None, capacity=None, board_size=8):
+        """Start the workers
+
+        Args:
+            processes ([int], optional): Number of worker processes, if None use the CPU count
+            capacity ([int], optional): Number of slots, the tasks in flight, by default 4 per process
+            board_size ([int]): Size of the board square
+        """
+        processes = processes or os.cpu_count()
+        self.layout = SharedLayout(capacity or processes * 4, board_size)
+        self._memory = SharedMemory(create=True, size=self.layout.get_size())
+        self.boards, self.tasks, self.histograms = self.layout.get_views(self._memory.buf)
+
+        self._task_queue = SimpleQueue()
+        self._result_queue = SimpleQueue()
+        self._workers = [Process(target=_worker, args=(self._memory.name, self.layout, self._task_queue,
+                                                       self._result_queue), daemon=True)
+                         for _ in range(processes)]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def imap(self, tasks):
+        """Run analysis tasks, keeping every slot busy
+
+        Args:
+            tasks ([iterable]): Tasks (board, player, action, depth), board is a two-channels board
+
+        Yields:
+            [ndarray(histogram_size)]: Histogram of each task, in task order. It's a view of
+                the shared memory, valid until the next histogram is requested
+        """
+        tasks = iter(tasks)
+        capacity = self.layout.capacity
+        submitted = received = collected = 0
+        done_slots = set()
+
+        try:
+            while submitted < capacity and self._submit(next(tasks, None), submitted % capacity):
+                submitted += 1
+
+            while collected < submitted:
+                slot = collected % capacity
+                while slot not in done_slots:
+                    done_slot, error = self._result_queue.get()
+                    received += 1
+                    if error is not None:
+                        raise RuntimeError(f'Analysis task failed in a worker: {error}')
+                    done_slots.add(done_slot)
+                done_slots.remove(slot)
+
+                yield self.histograms[slot]
+                collected += 1
+                # The slot is reused only once its histogram has been consumed
+                if self._submit(next(tasks, None), slot):
+                    submitted += 1
+        finally:
+            # Wait for the tasks still running when the consumer stops early
+            for _ in range(submitted - received):
+                self._result_queue.get()
+
+    def analyse_position(self, state, current_player, count_future_moves):
+        """Calculate the lottery of every valid action of a position, an action per task
+
+        Returns:
+            [dict]: Normalized lottery of each valid action (row, col)
+        """
+        actions = list(OthelloGame.get_player_actions_gains(state, current_player))
+        tasks = ((state, current_player, action, count_future_moves) for action in actions)
+        return {action: normalize_lottery(self.get_points(histogram))
+                for action, histogram in zip(actions, self.imap(tasks))}
+
+    def get_points(self, histogram):
+        """Convert a histogram to the points dict of MoveAnalysis
+
+        Returns:
+            [dict]: Number of lines ending in each points difference
+        """
+        differences = np.flatnonzero(histogram)
+        return dict(zip((differences - self.layout.histogram_offset).tolist(), histogram[differences].tolist()))
+
+    def close(self):
+        for _ in self._workers:
+            self._task_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self.boards = self.tasks = self.histograms = None
+        self._memory.close()
+        self._memory.unlink()
+
+    def _submit(self, task, slot):
+        if task is None:
+            return False
+        board, player, (row, col), depth = task
+        self.boards[slot] = board
+        self.tasks[slot] = player.value, row, col, depth
+        self._task_queue.put(slot)
+        return True
+
+
+def _worker(memory_name, layout, task_queue, result_queue):
+    memory = SharedMemory(memory_name)
+    boards, tasks, histograms = layout.get_views(memory.buf)
+    try:
+        while True:
+            slot = task_queue.get()
+            if slot is None:
+                break
+            try:
+                player, row, col, depth = tasks[slot].tolist()
+                analysis = MoveAnalysis(boards[slot], (row, col), OthelloPlayer(player), depth)
+                analysis.run()
+                points = analysis.get_result()
+                histograms[slot] = 0
+                histograms[slot, np.array(list(points), dtype=np.int64) + layout.histogram_offset] = \
+                    list(points.values())
+            except Exception as e:
+                result_queue.put((slot, repr(e)))
+            else:
+                result_queue.put((slot, None))
+    finally:
+        del boards, tasks, histograms
+        memory.close()
+
+
+def _pickled_task(board, player, action, depth):
+    analysis = MoveAnalysis(board, action, player, depth)
+    analysis.run()
+    return analysis.get_result()
+
+
+def _random_tasks(count, depth, seed=0):
+    rng = np.random.default_rng(seed)
+    tasks = []
+    while len(tasks) < count:
+        game = OthelloGame(8)
+        for _ in range(rng.integers(0, 50)):
+            if game.has_finished():
+                break
+            actions = game.get_valid_actions()
+            game.play(*actions[rng.integers(len(actions))])
+        if not game.has_finished():
+            board = np.copy(game.board(view=BoardView.TWO_CHANNELS))
+            tasks.extend((board, game.current_player, tuple(int(i) for i in action), depth)
+                         for action in game.get_valid_actions())
+    return tasks[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the shared memory pool with a pickling process pool')
+    parser.add_argument('--tasks', type=int, default=2000, help='Number of MoveAnalysis tasks')
+    parser.add_argument('--depth', type=int, default=0, help='Depth of each task, smaller tasks show the overhead')
+    parser.add_argument('--processes', type=int, help='Number of worker processes, CPU count by default')
+    args = parser.parse_args()
+
+    tasks = _random_tasks(args.tasks, args.depth)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.processes) as executor:
+        pickled_results = list(executor.map(_pickled_task, *zip(*tasks), chunksize=1))
+    pickled_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with SharedAnalysisPool(args.processes) as pool:
+        shared_results = [pool.get_points(histogram) for histogram in pool.imap(tasks)]
+    shared_elapsed = time.perf_counter() - start
+
+    if shared_results != pickled_results:
+        raise RuntimeError('The pools returned different results')
+    print(f'{len(tasks)} tasks of depth {args.depth}')
+    print(f'pickling pool: {pickled_elapsed:.2f}s ({len(tasks) / pickled_elapsed:.0f} tasks/s)')
+    print(f'shared memory pool: {shared_elapsed:.2f}s ({len(tasks) / shared_elapsed:.0f} tasks/s)')
+
+
+if __name__ == '__main__':
+    main()